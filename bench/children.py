@@ -0,0 +1,77 @@
+"""
+Benchmark the lookup of a child resource on classes with many children.
+
+Compares, for classes of 10, 50 and 200 children, the plain scan of the
+child factories with the child index, with and without the combined regexes.
+
+    python bench/children.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import resource
+
+
+SIZES = 10, 50, 200
+NUMBER = 2000
+
+
+def make_class(size, template):
+    """
+    Return a Resource class with size children built from the template.
+    """
+    def factory(n):
+        def func(self, request, segments, **kwargs):
+            return n
+        return resource.child(template % n)(func)
+    attrs = dict(('child%d' % n, factory(n)) for n in range(size))
+    return type('Bench%d' % size, (resource.Resource,), attrs)
+
+
+SHAPES = [
+    # Children known by name.
+    ('names', 'child%d', [u'child%d'], [u'nope']),
+    # Children sharing a literal prefix followed by a dynamic segment.
+    ('prefixed', 'items/%d/{id}', [u'items', u'%d', u'42'],
+     [u'items', u'nope', u'42']),
+    # Children told apart by a dynamic segment only.
+    ('dynamic', 'x%d-{id:[0-9]+}', [u'x%d-42'], [u'nope-42']),
+    # Children sharing a literal prefix followed by a typed segment.
+    ('typed', 'items/%d/{id:int}', [u'items', u'%d', u'42'],
+     [u'items', u'%d', u'nope']),
+]
+
+
+def bench(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER * 1e6
+
+
+def main():
+    print '%-10s %5s %-5s %10s %10s %10s' % ('shape', 'size', 'path',
+                                              'scan', 'trie', 'combined')
+    for name, template, hit, miss in SHAPES:
+        for size in SIZES:
+            cls = make_class(size, template)
+            factories = cls.child_factories
+            trie = resource._ChildIndex(factories, combine=False)
+            combined = resource._ChildIndex(factories)
+            for label, segments in [('last', hit), ('miss', miss)]:
+                segments = [s.replace('%d', str(size - 1)) for s in segments]
+                timings = [
+                    bench(lambda: resource._scan_child_factories(
+                        factories, None, segments)),
+                    bench(lambda: trie.find(None, segments)),
+                    bench(lambda: combined.find(None, segments)),
+                    ]
+                print '%-10s %5d %-5s %8.2fus %8.2fus %8.2fus' % (
+                    (name, size, label) + tuple(timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""
+Benchmark the revalidation of a page by a client or a cache holding it.
+
+Compares the unconditional GET, rendering a page of 200 rows, with the
+conditional GET sending If-None-Match or If-Modified-Since, answered with a 304
+from the @resource.etag and @resource.last_modified hooks without calling the
+GET handler.
+
+    python bench/conditional.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import app, http, resource
+
+
+NUMBER = 2000
+ROWS = ['<tr><td>%d</td><td>entry %d</td></tr>' % (n, n) for n in xrange(200)]
+
+
+class Root(resource.Resource):
+
+    @resource.GET(accept='html')
+    def html(self, request):
+        body = '<table>%s</table>' % ''.join(ROWS)
+        return http.ok([], body)
+
+    @resource.etag
+    def etag(self, request):
+        return 'v42'
+
+    @resource.last_modified
+    def last_modified(self, request):
+        return 1276000000
+
+
+def start_response(status, headers):
+    pass
+
+
+def request(application, headers):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'SCRIPT_NAME': '',
+               'HTTP_ACCEPT': 'text/html', 'SERVER_NAME': 'localhost',
+               'SERVER_PORT': '80', 'wsgi.url_scheme': 'http'}
+    environ.update(headers)
+    return ''.join(application(environ, start_response))
+
+
+def main():
+    application = app.RestishApp(Root())
+    print '%-16s %10s %10s' % ('request', 'time', 'bytes')
+    for name, headers in [
+            ('unconditional', {}),
+            ('if-none-match', {'HTTP_IF_NONE_MATCH': '"v42"'}),
+            ('if-modified', {'HTTP_IF_MODIFIED_SINCE':
+                             'Tue, 08 Jun 2010 12:26:40 GMT'})]:
+        timing = min(timeit.repeat(lambda: request(application, headers),
+                                   number=NUMBER, repeat=5))
+        print '%-16s %8.2fus %10d' % (name, timing / NUMBER * 1e6,
+                                      len(request(application, headers)))
+
+
+if __name__ == '__main__':
+    main()
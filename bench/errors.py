@@ -0,0 +1,85 @@
+"""
+Benchmark the error responses of an application: 404, 405 and 406.
+
+Compares creating a webob based http.Response for each error, like the
+factories used to, with the shared frozen responses sent as they are, both for
+the responses alone and for whole requests through RestishApp.
+
+    python bench/errors.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import app, http, resource
+
+
+NUMBER = 10000
+
+
+ERRORS = [
+    ('404', http.not_found,
+     lambda: http.Response('404 Not Found', [('Content-Type', 'text/plain')],
+                           '404 Not Found'),
+     {'PATH_INFO': '/nope'}),
+    ('405', lambda: http.method_not_allowed('GET, HEAD, OPTIONS'),
+     lambda: http.Response('405 Method Not Allowed',
+                           [('Content-Type', 'text/plain'),
+                            ('Allow', 'GET, HEAD, OPTIONS')],
+                           '405 Method Not Allowed'),
+     {'REQUEST_METHOD': 'DELETE'}),
+    ('406', http.not_acceptable,
+     lambda: http.Response('406 Not Acceptable',
+                           [('Content-Type', 'text/plain')],
+                           '406 Not Acceptable'),
+     {'HTTP_ACCEPT': 'image/png'}),
+    ]
+
+
+class Root(resource.Resource):
+
+    @resource.GET(accept='json')
+    def json(self, request):
+        return http.ok([], '{}')
+
+
+def start_response(status, headers):
+    pass
+
+
+def send(factory):
+    response = factory()
+    start_response(response.status, response.headerlist)
+    return ''.join(response.app_iter)
+
+
+def request(application, environ):
+    environ = dict(environ)
+    environ.setdefault('REQUEST_METHOD', 'GET')
+    environ.setdefault('PATH_INFO', '/')
+    environ.update({'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost',
+                    'SERVER_PORT': '80', 'wsgi.url_scheme': 'http'})
+    return ''.join(application(environ, start_response))
+
+
+def timing(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=3)) / NUMBER * 1e6
+
+
+def main():
+    application = app.RestishApp(Root())
+    print '%-6s %10s %10s %10s' % ('error', 'webob', 'frozen', 'request')
+    for name, factory, webob_factory, environ in ERRORS:
+        print '%-6s %8.2fus %8.2fus %8.2fus' % (
+            name, timing(lambda: send(webob_factory)),
+            timing(lambda: send(factory)),
+            timing(lambda: request(application, environ)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Benchmark the ETag middleware: the time spent hashing the bodies against the
+bytes the 304 responses save.
+
+Compares the plain application with the one wrapped in etag.ETagMiddleware,
+for str bodies and streamed bodies of 1kB, 64kB and 1MB: the time per request
+without If-None-Match, and the time and bytes sent with a matching one.
+
+    python bench/etags.py
+"""
+
+import hashlib
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import app, etag, http, resource
+
+
+SIZES = [1024, 64 * 1024, 1024 * 1024]
+
+
+class Root(resource.Resource):
+
+    def __init__(self, body, stream):
+        self.body = body
+        self.stream = stream
+
+    @resource.GET()
+    def get(self, request):
+        body = self.body
+        if self.stream:
+            data = body
+            body = (data[i:i + 8192] for i in xrange(0, len(data), 8192))
+        return http.ok([('Content-Type', 'application/octet-stream')], body)
+
+
+def start_response(status, headers):
+    pass
+
+
+def request(application, headers={}):
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'SCRIPT_NAME': '',
+               'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+               'wsgi.url_scheme': 'http'}
+    environ.update(headers)
+    app_iter = application(environ, start_response)
+    try:
+        return len(''.join(app_iter))
+    finally:
+        if hasattr(app_iter, 'close'):
+            app_iter.close()
+
+
+def timing(func, number):
+    return min(timeit.repeat(func, number=number, repeat=5)) / number * 1e6
+
+
+def main():
+    print '%-8s %7s %10s %10s %10s %10s %10s' % (
+            'body', 'size', 'plain', 'etag', '304', 'bytes', 'bytes 304')
+    for stream in [False, True]:
+        for size in SIZES:
+            number = max(10, 20000000 / (size * 20))
+            plain = app.RestishApp(Root('x' * size, stream))
+            middleware = etag.ETagMiddleware(
+                    app.RestishApp(Root('x' * size, stream)),
+                    buffer_size=1024 * 1024)
+            # The first request streams and memoises the ETag.
+            request(middleware)
+            headers = {'HTTP_IF_NONE_MATCH':
+                       '"%s"' % hashlib.md5('x' * size).hexdigest()}
+            print '%-8s %6dk %8.2fus %8.2fus %8.2fus %10d %10d' % (
+                stream and 'stream' or 'str', size / 1024,
+                timing(lambda: request(plain), number),
+                timing(lambda: request(middleware), number),
+                timing(lambda: request(middleware, headers), number),
+                request(middleware), request(middleware, headers))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,52 @@
+"""
+Benchmark the rendering of a page of 500 links built from the request URLs.
+
+Compares building the links from the URL properties of webob, creating a new
+URL each time, with the cached URL properties of http.Request.
+
+    python bench/links.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+import webob
+
+from restish import http, url
+
+
+LINKS = 500
+NUMBER = 20
+
+
+def render_uncached(request):
+    return [url.URL(webob.Request.application_url.fget(request)).child(
+                'items', str(n)) for n in xrange(LINKS)]
+
+
+def render_cached(request):
+    return [request.application_url.child('items', str(n))
+            for n in xrange(LINKS)]
+
+
+def bench(render):
+    environ = http.Request.blank('/items?page=2', base_url='/app').environ
+    def page():
+        render(http.Request(environ))
+    return min(timeit.repeat(page, number=NUMBER, repeat=3)) / NUMBER * 1e3
+
+
+def main():
+    print '%-10s %10s' % ('urls', 'page')
+    for name, render in [('uncached', render_uncached),
+                         ('cached', render_cached)]:
+        print '%-10s %8.2fms' % (name, bench(render))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark the request objects created for each request.
+
+Compares the webob based http.Request with the http.LazyRequest of
+RestishApp(..., lazy_request=True), for a health check only needing the
+method and the path, and for a search reading the query string: the time per
+request and the bytes allocated for the request objects it keeps.
+
+    python bench/requests.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import app, http, resource
+
+
+NUMBER = 10000
+
+
+class Health(resource.Resource):
+
+    @resource.GET()
+    def get(self, request):
+        request.environ['bench.request'] = request
+        return http.SimpleResponse('200 OK', [('Content-Type', 'text/plain')],
+                                   'ok')
+
+
+class Root(resource.Resource):
+
+    health = resource.child('health', Health)
+
+    @resource.GET()
+    def get(self, request):
+        request.environ['bench.request'] = request
+        return http.SimpleResponse('200 OK', [('Content-Type', 'text/plain')],
+                                   request.GET.get('q', '').encode('utf-8'))
+
+
+def environ(path, query=''):
+    return {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': query,
+            'SCRIPT_NAME': '', 'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80', 'wsgi.url_scheme': 'http',
+            'wsgi.input': None}
+
+
+def start_response(status, headers):
+    pass
+
+
+def size(obj, environ):
+    """
+    Return the bytes of the object and of what it holds, but the environ.
+    """
+    if obj is environ or obj is None:
+        return 0
+    total = sys.getsizeof(obj)
+    if isinstance(obj, http.LazyRequest):
+        return total + size(obj._request, environ)
+    attrs = getattr(obj, '__dict__', None)
+    if attrs is not None:
+        total += sys.getsizeof(attrs)
+        for value in attrs.values():
+            if isinstance(value, dict) and value is not environ:
+                total += sys.getsizeof(value)
+            elif isinstance(value, object) and \
+                    value.__class__.__module__.startswith('webob'):
+                total += size(value, environ)
+    return total
+
+
+def request(application, path, query):
+    env = environ(path, query)
+    ''.join(application(env, start_response))
+    return env
+
+
+def main():
+    print '%-10s %10s %10s %10s %10s' % ('request', 'health', 'bytes',
+                                         'search', 'bytes')
+    for name, lazy in [('webob', False), ('lazy', True)]:
+        application = app.RestishApp(Root(), lazy_request=lazy)
+        row = [name]
+        for path, query in [('/health', ''), ('/', 'q=restish')]:
+            row.append(min(timeit.repeat(
+                lambda: request(application, path, query), number=NUMBER,
+                repeat=5)) / NUMBER * 1e6)
+            env = request(application, path, query)
+            row.append(size(env['bench.request'], env))
+        print '%-10s %8.2fus %10d %8.2fus %10d' % tuple(row)
+
+
+if __name__ == '__main__':
+    main()
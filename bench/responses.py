@@ -0,0 +1,76 @@
+"""
+Benchmark the creation and sending of a small response.
+
+Compares the webob based http.Response with http.SimpleResponse, for a str
+body and for an iterable body, alone and for whole requests through
+RestishApp.
+
+    python bench/responses.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import app, http, resource
+
+
+NUMBER = 10000
+BODY = '{"id": 1, "name": "entry"}'
+HEADERS = [('Content-Type', 'application/json'), ('Cache-Control', 'no-cache')]
+
+
+def start_response(status, headers):
+    pass
+
+
+def send(response):
+    start_response(response.status, response.headerlist)
+    return ''.join(response.app_iter)
+
+
+def root(cls, iterable):
+    def body():
+        if iterable:
+            return iter([BODY])
+        return BODY
+    class Root(resource.Resource):
+        @resource.GET(accept='json')
+        def json(self, request):
+            return cls('200 OK', list(HEADERS), body())
+    return app.RestishApp(Root())
+
+
+ENVIRON = {'REQUEST_METHOD': 'GET', 'PATH_INFO': '/', 'SCRIPT_NAME': '',
+           'HTTP_ACCEPT': 'application/json', 'SERVER_NAME': 'localhost',
+           'SERVER_PORT': '80', 'wsgi.url_scheme': 'http'}
+
+
+def request(application):
+    return ''.join(application(dict(ENVIRON), start_response))
+
+
+def timing(func):
+    return min(timeit.repeat(func, number=NUMBER, repeat=5)) / NUMBER * 1e6
+
+
+def main():
+    print '%-10s %10s %10s %10s %10s' % ('response', 'str', 'iterable',
+                                         'request', 'iterable')
+    for name, cls in [('webob', http.Response),
+                      ('simple', http.SimpleResponse)]:
+        applications = root(cls, False), root(cls, True)
+        print '%-10s %8.2fus %8.2fus %8.2fus %8.2fus' % (
+            name,
+            timing(lambda: send(cls('200 OK', list(HEADERS), BODY))),
+            timing(lambda: send(cls('200 OK', list(HEADERS), iter([BODY])))),
+            timing(lambda: request(applications[0])),
+            timing(lambda: request(applications[1])))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,114 @@
+"""
+Benchmark the cold start of an application of 300 resource classes: the time
+to import it and the time to its first response.
+
+Compares importing the resources and compiling every template and negotiation
+table at once, like the metaclass used to, along with the modules restish used
+to import and the system mimetypes database, with the lazy compilation on
+first dispatch. Each run is in a fresh interpreter.
+
+    python bench/startup.py
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+
+CLASSES = 300
+REPEAT = 5
+
+MODULE = '''
+from restish import http, resource
+
+class Leaf(resource.Resource):
+    @resource.GET(accept='json')
+    def json(self, request):
+        return http.ok([], '{}')
+'''
+
+CLASS = '''
+class Resource%(n)d(resource.Resource):
+    item = resource.child('items/{id:int}/{slug}', Leaf)
+    tag = resource.child('tags/{tag:[a-z]+}', Leaf)
+    other = resource.child('{name}-%(n)d', Leaf)
+    @resource.GET(accept='html')
+    def html(self, request):
+        return http.ok([], '')
+    @resource.GET(accept='json')
+    def json(self, request):
+        return http.ok([], '')
+    @resource.POST(content_type='json')
+    def post(self, request):
+        return http.ok([], '')
+'''
+
+ROOT_CHILD = '''
+    r%(n)d = resource.child('r%(n)d', Resource%(n)d)'''
+
+RUN = '''
+import time
+start = time.time()
+if %(eager)r:
+    import json, mimetypes, optparse, uuid
+    mimetypes.init()
+from restish import app, resource
+import routes
+def subclasses(cls):
+    for subclass in cls.__subclasses__():
+        yield subclass
+        for subclass in subclasses(subclass):
+            yield subclass
+if %(eager)r:
+    for cls in subclasses(resource.Resource):
+        cls._negotiators
+        cls._child_index
+        for matcher, func in cls.child_factories:
+            if isinstance(matcher, resource.TemplateChildMatcher):
+                matcher._compile()
+imported = time.time()
+environ = {'REQUEST_METHOD': 'GET', 'SCRIPT_NAME': '',
+           'PATH_INFO': '/r150/items/1/x', 'HTTP_ACCEPT': 'application/json',
+           'SERVER_NAME': 'localhost', 'SERVER_PORT': '80',
+           'wsgi.url_scheme': 'http'}
+body = ''.join(app.RestishApp(routes.Root())(environ, lambda *args: None))
+assert body == '{}', body
+print imported - start, time.time() - imported
+'''
+
+
+def timing(directory, eager=False):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(
+            [directory, os.path.dirname(os.path.dirname(
+                os.path.abspath(__file__)))])
+    timings = []
+    for n in xrange(REPEAT):
+        output = subprocess.check_output(
+                [sys.executable, '-c', RUN % {'eager': eager}], env=env)
+        timings.append([float(timing) for timing in output.split()])
+    return [min(timing) for timing in zip(*timings)]
+
+
+def main():
+    directory = tempfile.mkdtemp()
+    try:
+        with open(os.path.join(directory, 'routes.py'), 'w') as f:
+            f.write(MODULE)
+            for n in xrange(CLASSES):
+                f.write(CLASS % {'n': n})
+            f.write('\nclass Root(resource.Resource):')
+            for n in xrange(CLASSES):
+                f.write(ROOT_CHILD % {'n': n})
+        print '%-10s %10s %10s' % ('startup', 'import', 'response')
+        for name, kwargs in [('eager', {'eager': True}), ('lazy', {})]:
+            print '%-10s %8.2fms %8.2fms' % ((name,) + tuple(
+                t * 1e3 for t in timing(directory, **kwargs)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    main()
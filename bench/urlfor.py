@@ -0,0 +1,81 @@
+"""
+Benchmark a listing template making 1,000 url_for calls.
+
+Compares walking up the resource tree and formatting each template, like
+url_for used to, with the compiled URL formatters, called one by one or in
+bulk through urls_for.
+
+    python bench/urlfor.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import resource, url
+
+
+CALLS = 1000
+NUMBER = 50
+
+
+class Entry(resource.Resource):
+    pass
+
+
+class Blog(resource.Resource):
+    entry = resource.child('{year}/{month}/{slug}', Entry)
+
+
+class Root(resource.Resource):
+    blog = resource.child('blogs/{blog}', Blog)
+
+
+class Item(object):
+
+    def __init__(self, n):
+        self.blog = 'news'
+        self.year = 2010
+        self.month = n % 12 + 1
+        self.slug = 'entry number %d' % n
+
+
+def walk_url_for(cls, *args, **kwargs):
+    parents = []
+    while hasattr(cls, '_parent'):
+        segments = cls._parent.child_matchers.get(cls, None)._url_for(
+            *args, **kwargs)
+        segments.reverse()
+        parents += segments
+        cls = cls._parent
+    if len(parents):
+        parents.reverse()
+    else:
+        parents = ['']
+    return url.URL('/').child(*parents)
+
+
+def main():
+    items = [Item(n) for n in xrange(CALLS)]
+    dicts = [item.__dict__ for item in items]
+    print '%-10s %10s %10s' % ('url_for', 'dicts', 'objects')
+    for name, urls in [
+            ('walk', lambda objects: [walk_url_for(Entry, obj)
+                                      for obj in objects]),
+            ('compiled', lambda objects: [resource.url_for(Entry, obj)
+                                          for obj in objects]),
+            ('bulk', lambda objects: resource.urls_for(Entry, objects)),
+            ]:
+        timings = [min(timeit.repeat(lambda: urls(objects), number=NUMBER,
+                                     repeat=3))
+                   for objects in (dicts, items)]
+        print '%-10s %8.2fms %8.2fms' % ((name,) + tuple(
+            timing / NUMBER * 1e3 for timing in timings))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""
+Benchmark the creation of URLs by the manipulation methods of url.URL.
+
+Compares the lazily parsed URLs with URLs split as soon as they are created,
+like they used to be, for a page of 500 links: the time to build them and the
+memory they hold.
+
+    python bench/urls.py
+"""
+
+import os
+import sys
+import timeit
+
+# Run from a checkout, without installing restish.
+sys.path.insert(0, os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))))
+
+from restish import url
+
+
+LINKS = 500
+NUMBER = 20
+
+
+class EagerURL(url.URL):
+    """
+    URL split when created.
+    """
+
+    def __new__(cls, u):
+        self = url.URL.__new__(cls, u)
+        self.parsed_url
+        return self
+
+
+def page(cls):
+    base = cls('http://localhost/app/items?page=2')
+    links = []
+    for n in xrange(LINKS):
+        link = base.child(str(n))
+        links.append(link)
+        links.append(link.add_query('format', 'json'))
+        links.append(link.anchor('comments'))
+    return links
+
+
+def size(link):
+    """
+    Return the bytes held by the link.
+    """
+    total = sys.getsizeof(link)
+    parsed = link.__dict__.get('_parsed_url')
+    if parsed is not None:
+        total += sys.getsizeof(link.__dict__) + sys.getsizeof(parsed)
+    return total
+
+
+def main():
+    print '%-10s %10s %10s' % ('urls', 'page', 'bytes')
+    for name, cls in [('eager', EagerURL), ('lazy', url.URL)]:
+        timing = min(timeit.repeat(lambda: page(cls), number=NUMBER,
+                                   repeat=3)) / NUMBER * 1e3
+        print '%-10s %8.2fms %10d' % (name, timing,
+                                      sum(size(link) for link in page(cls)))
+
+
+if __name__ == '__main__':
+    main()
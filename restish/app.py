@@ -1,19 +1,51 @@
 """
 Core wsgi application
 """
-from restish import error, http, url
+from restish import cache, error, http, routing, url
+from restish.resource import Resource, _create_child, \
+        _declared_child_class, _traversal_cacheable
+
+
+_resource_child = Resource.resource_child.im_func
 
 
 class RestishApp(object):
 
-    def __init__(self, root_resource, charset=None):
+    def __init__(self, root_resource, charset=None,
+                 traversal_cache_size=1000, compile_routes=False,
+                 not_found_cache_size=0, not_found_ttl=60,
+                 lazy_request=False):
         self.root = root_resource
         # the charset in which the request is parsed
         self.charset = charset
+        # Create the webob request only when the resources need more than
+        # the method and the path.
+        if lazy_request:
+            self.request_class = http.LazyRequest
+        else:
+            self.request_class = http.Request
+        # PATH_INFO -> (class chain, match args, match kwargs) of the
+        # traversals going only through traversal cacheable resources.
+        if traversal_cache_size:
+            self.traversal_cache = cache.LRUCache(traversal_cache_size)
+        else:
+            self.traversal_cache = None
+        # PATH_INFO of the traversals that ended with a 404 while going only
+        # through traversal cacheable resources, for not_found_ttl seconds.
+        if not_found_cache_size:
+            self.not_found_cache = cache.LRUCache(not_found_cache_size,
+                                                  ttl=not_found_ttl)
+        else:
+            self.not_found_cache = None
+        # Route table of the tree declared below the root resource.
+        if compile_routes and isinstance(root_resource, Resource):
+            self.routes = routing.compile_routes(root_resource.__class__)
+        else:
+            self.routes = None
 
     def __call__(self, environ, start_response):
         # Create a request object.
-        request = http.Request(environ)
+        request = self.request_class(environ)
         if self.charset is not None:
             request.charset = self.charset
         try:
@@ -31,21 +63,71 @@ class RestishApp(object):
         Locate the resource at the path in request URL by traversing the
         resource hierarchy.
         """
+        path = request.environ['PATH_INFO']
+        resource = self.root
+        # Classes of the children declared by the traversal cacheable
+        # resources, as long as the traversal only goes through those.
+        chain = None
+        if (self.traversal_cache is not None or
+                self.not_found_cache is not None) and \
+                _traversal_cacheable(resource):
+            if self.not_found_cache is not None and \
+                    self.not_found_cache.get(path) is not None:
+                return http.not_found()
+            if self.traversal_cache is not None:
+                cached = self.traversal_cache.get(path)
+                if cached is not None:
+                    # Only the last resource needs to be created.
+                    classes, args, kwargs = cached
+                    return _create_child(classes[-1], args, kwargs)
+            chain = [resource.__class__]
         # Calculate the path segments relative to the application,
         # special-casing requests for the the root segment (because we already
         # have a reference to the root resource).
-        segments = url.split_path(request.environ['PATH_INFO'])
+        segments = url.split_path(path)
         if segments == ['']:
             segments = []
+        # Walk the segments with a cursor rather than copying what remains at
+        # each level.
+        segments = url.SegmentCursor(segments)
+        # Skip the part of the hierarchy resolved by the route table.
+        if self.routes is not None and segments:
+            resolved = self.routes.resolve(request, segments)
+            if resolved is None:
+                raise http.NotFoundError()
+            classes, args, kwargs, segments = resolved
+            if len(classes) > 1:
+                resource = _create_child(classes[-1], args, kwargs)
+                if chain is not None and not segments and \
+                        self.traversal_cache is not None and \
+                        _traversal_cacheable_classes(classes[:-1]):
+                    self.traversal_cache.set(path, resolved[:3])
+                chain = None
         # Recurse into the resource hierarchy until we run out of segments or
         # find a Response.
-        resource = self.root
-        while segments and not isinstance(resource, http.Response):
-            resource_child = getattr(resource, 'resource_child', None)
-            # No resource_child method? 404.
-            if resource_child is None:
-                raise http.NotFoundError()
-            result = resource_child(request, segments)
+        while segments and not isinstance(resource, http.BaseResponse):
+            if chain is not None:
+                result, chain = self._cacheable_child(request, resource,
+                                                      segments, chain)
+                if isinstance(chain, tuple):
+                    if self.traversal_cache is not None:
+                        self.traversal_cache.set(path, chain)
+                elif result is None and chain is not None:
+                    # No child factory matched, whatever the request.
+                    if self.not_found_cache is not None:
+                        self.not_found_cache.set(path, True)
+                    raise http.NotFoundError()
+            else:
+                resource_child = getattr(resource, 'resource_child', None)
+                # No resource_child method? 404.
+                if resource_child is None:
+                    raise http.NotFoundError()
+                # Only the resource_child of Resource knows about cursors.
+                if segments.__class__ is url.SegmentCursor and \
+                        getattr(resource_child, 'im_func', None) is not \
+                        _resource_child:
+                    segments = list(segments)
+                result = resource_child(request, segments)
             # No result returned? 404.
             if result is None:
                 raise http.NotFoundError()
@@ -57,6 +139,34 @@ class RestishApp(object):
                 resource = result
         return resource
 
+    def _cacheable_child(self, request, resource, segments, chain):
+        """
+        Call resource.resource_child(request, segments) on a traversal
+        cacheable resource, adding the class of the child to the chain.
+
+        Return the result and the chain, or None when the traversal can no
+        longer be cached. The chain of a child left without segments is a
+        (classes, match args, match kwargs) tuple ready for the cache. The
+        chain is left as it is when no child factory matched.
+        """
+        found = resource._find_child(request, segments)
+        if found is None:
+            return None, chain
+        func, args, kwargs, segments = found
+        result = func(resource, request, segments, *args, **kwargs)
+        child_class = _declared_child_class(func)
+        if child_class is None:
+            # Same as Resource.resource_child.
+            if result is not None and not isinstance(result, tuple):
+                result = result, segments
+            return result, None
+        chain.append(child_class)
+        if not segments:
+            return result, (tuple(chain), args, kwargs)
+        if not _traversal_cacheable(result[0]):
+            return result, None
+        return result, chain
+
     def get_response(self, request, resource_or_response):
         """
         Resolve the resource/response until we get a response.
@@ -65,7 +175,18 @@ class RestishApp(object):
         a callable resource. A callable resource may return another callable to
         use in its place.
         """
-        while not isinstance(resource_or_response, http.Response):
+        while not isinstance(resource_or_response, http.BaseResponse):
             resource_or_response = resource_or_response(request)
         return resource_or_response
 
+
+def _traversal_cacheable_classes(classes):
+    """
+    Tell whether the children of instances of the classes can be cached by
+    path.
+    """
+    for cls in classes:
+        if not cls.traversal_cacheable:
+            return False
+    return True
+
@@ -0,0 +1,139 @@
+"""
+Bounded caches used to memoise the work done on the hot paths.
+"""
+
+import threading
+import time
+
+
+class LRUCache(object):
+    """
+    Mapping of a bounded size that discards the least recently used entries.
+
+    With a ttl, the entries expire that many seconds, as told by timer, after
+    they were set.
+
+    The cache counts its hits, misses, evictions and expirations, see stats().
+    It is safe to share it between threads.
+    """
+
+    def __init__(self, maxsize=1000, ttl=None, timer=time.time):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self._lock = threading.Lock()
+        # key -> [previous link, next link, key, value, expiry time]
+        self._links = {}
+        # Circular doubly linked list, most recently used first.
+        self._root = root = []
+        root[:] = [root, root, None, None, None]
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        return len(self._links)
+
+    def __contains__(self, key):
+        link = self._links.get(key)
+        return link is not None and (self.ttl is None or
+                                     link[4] > self.timer())
+
+    def get(self, key, default=None):
+        """
+        Return the value cached for the key, or default.
+        """
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is None:
+                self.misses += 1
+                return default
+            if self.ttl is not None and link[4] <= self.timer():
+                self._unlink(link)
+                del self._links[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self.hits += 1
+            self._move_to_front(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def set(self, key, value):
+        """
+        Cache the value for the key, evicting the least recently used entry
+        when the cache is full.
+        """
+        if self.ttl is None:
+            expiry = None
+        else:
+            expiry = self.timer() + self.ttl
+        self._lock.acquire()
+        try:
+            link = self._links.get(key)
+            if link is not None:
+                link[3] = value
+                link[4] = expiry
+                self._move_to_front(link)
+                return
+            root = self._root
+            if len(self._links) >= self.maxsize:
+                if not self.maxsize:
+                    return
+                oldest = root[0]
+                self._unlink(oldest)
+                del self._links[oldest[2]]
+                self.evictions += 1
+            first = root[1]
+            link = [root, first, key, value, expiry]
+            first[0] = root[1] = self._links[key] = link
+        finally:
+            self._lock.release()
+
+    def pop(self, key, default=None):
+        """
+        Remove the entry of the key and return its value, or default.
+        """
+        self._lock.acquire()
+        try:
+            link = self._links.pop(key, None)
+            if link is None:
+                return default
+            self._unlink(link)
+            return link[3]
+        finally:
+            self._lock.release()
+
+    def clear(self):
+        """
+        Remove all the entries, keeping the counters.
+        """
+        self._lock.acquire()
+        try:
+            self._links.clear()
+            root = self._root
+            root[:] = [root, root, None, None, None]
+        finally:
+            self._lock.release()
+
+    def stats(self):
+        """
+        Return the counters and size of the cache as a dict.
+        """
+        return {'hits': self.hits, 'misses': self.misses,
+                'evictions': self.evictions, 'expirations': self.expirations,
+                'size': len(self._links), 'maxsize': self.maxsize}
+
+    def _unlink(self, link):
+        previous, next = link[0], link[1]
+        previous[1] = next
+        next[0] = previous
+
+    def _move_to_front(self, link):
+        root = self._root
+        if root[1] is link:
+            return
+        self._unlink(link)
+        first = root[1]
+        link[0], link[1] = root, first
+        first[0] = root[1] = link
@@ -13,7 +13,7 @@ class HTTPError(RestishException):
 
     The derived exception class is expected to override response_factory (None
     by default), providing a callable that accepts all the positional and
-    keyword args and returns an http.Response instance.  Typically,
+    keyword args and returns an http.BaseResponse instance.  Typically,
     response_factory can be set to one of the HTTP response convenience
     functions in the http module.
     """
@@ -0,0 +1,171 @@
+"""
+WSGI middleware giving strong ETags, hashed from the body, to the responses
+without validators.
+"""
+
+import hashlib
+
+from restish import cache, http
+
+
+# Headers of a 200 response kept by the 304 replacing it.
+_NOT_MODIFIED_HEADERS = frozenset(['cache-control', 'content-location', 'date',
+                                   'expires', 'vary'])
+
+
+class ETagMiddleware(object):
+    """
+    WSGI middleware giving the 200 responses to GET requests that do not have
+    an ETag header a strong one, the MD5 digest of their body, and sending
+    http.not_modified() instead when the If-None-Match of the request matches
+    it.
+
+    Bodies made of strings are hashed at once. The other iterables are
+    streamed through an app_iter hashing them the first time a representation,
+    told apart by its path, query string, Content-Type, Content-Encoding and
+    Content-Language, is sent: its ETag is memoised when the body is
+    exhausted, unless it is over buffer_size bytes. The later bodies of the
+    memoised representations are read and hashed before being sent, with
+    their ETag, or streamed again when they turn out to be over buffer_size
+    bytes.
+
+    The body is still made for each request, only the bandwidth is saved: the
+    @resource.etag and @resource.last_modified hooks save the work too, when
+    the validators are cheaper to tell.
+
+    The responses whose body is written with the write callable of
+    start_response, or that are started once their body is iterated, are
+    sent as they are.
+    """
+
+    def __init__(self, application, cache_size=1000, buffer_size=65536):
+        self.application = application
+        self.buffer_size = buffer_size
+        # Representation -> ETag of its last streamed body.
+        self.etags = cache.LRUCache(cache_size)
+
+    def __call__(self, environ, start_response):
+        if environ.get('REQUEST_METHOD') != 'GET':
+            return self.application(environ, start_response)
+        started = []
+        written = []
+        def capture(status, headers, exc_info=None):
+            if written or started and started[0] is None:
+                # Too late, the body is already on its way.
+                return start_response(status, headers, exc_info)
+            started[:] = [(status, headers, exc_info)]
+            return write
+        def write(data):
+            # The body is written rather than returned: start the response
+            # and send it as it comes, without an ETag.
+            if not written:
+                written.append(start_response(*started[0]))
+            written[0](data)
+        app_iter = self.application(environ, capture)
+        if written:
+            return app_iter
+        if not started:
+            started.append(None)
+            return app_iter
+        status, headers, exc_info = started[0]
+        if exc_info is not None or not status.startswith('200') or \
+                _header(headers, 'etag') is not None:
+            start_response(status, headers, exc_info)
+            return app_iter
+        if isinstance(app_iter, (list, tuple)):
+            return _send(environ, start_response, status, headers, app_iter)
+        key = (environ.get('SCRIPT_NAME'), environ.get('PATH_INFO'),
+               environ.get('QUERY_STRING'), _header(headers, 'content-type'),
+               _header(headers, 'content-encoding'),
+               _header(headers, 'content-language'))
+        chunks = []
+        iterator = iter(app_iter)
+        if key in self.etags:
+            size = 0
+            for chunk in iterator:
+                chunks.append(chunk)
+                size += len(chunk)
+                if size > self.buffer_size:
+                    break
+            else:
+                _close(app_iter)
+                return _send(environ, start_response, status, headers, chunks)
+        start_response(status, headers)
+        return _HashingIter(app_iter, chunks, iterator, self._memoise(key))
+
+    def _memoise(self, key):
+        """
+        Return the function memoising the ETag of a streamed body of the
+        representation, given its digest and size.
+        """
+        def memoise(digest, size):
+            if size > self.buffer_size:
+                self.etags.pop(key)
+            else:
+                self.etags.set(key, '"%s"' % digest.hexdigest())
+        return memoise
+
+
+class _HashingIter(object):
+    """
+    Body streamed from the chunks already read then the rest of the iterator,
+    hashing it along and calling done(digest, size) once it is exhausted.
+    """
+
+    def __init__(self, app_iter, chunks, iterator, done):
+        self.app_iter = app_iter
+        self.chunks = chunks
+        self.iterator = iterator
+        self.done = done
+
+    def __iter__(self):
+        digest = hashlib.md5()
+        size = 0
+        for chunk in self.chunks:
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+        self.chunks = None
+        for chunk in self.iterator:
+            digest.update(chunk)
+            size += len(chunk)
+            yield chunk
+        self.done(digest, size)
+
+    def close(self):
+        _close(self.app_iter)
+
+
+def _send(environ, start_response, status, headers, chunks):
+    """
+    Send the body, or a 304 when the If-None-Match of the request matches its
+    digest.
+    """
+    digest = hashlib.md5()
+    for chunk in chunks:
+        digest.update(chunk)
+    etag = '"%s"' % digest.hexdigest()
+    if http.is_not_modified(environ, etag):
+        _close(chunks)
+        headers = [(name, value) for (name, value) in headers
+                   if name.lower() in _NOT_MODIFIED_HEADERS]
+        headers.append(('ETag', etag))
+        return http.not_modified(headers)(environ, start_response)
+    start_response(status, list(headers) + [('ETag', etag)])
+    return chunks
+
+
+def _header(headers, name):
+    """
+    Return the value of the first header of the name, in lower case, or None.
+    """
+    for header, value in headers:
+        if header.lower() == name:
+            return value
+    return None
+
+
+def _close(app_iter):
+    close = getattr(app_iter, 'close', None)
+    if close is not None:
+        close()
@@ -3,11 +3,12 @@ HTTP Request and Response objects, simple Response factories and exceptions
 types for common HTTP errors.
 """
 import cgi
+import re
 import webob
 import urllib
 
 
-from restish import error, url
+from restish import cache, error, url
 
 
 class Request(webob.Request):
@@ -24,20 +25,22 @@ class Request(webob.Request):
 
     def __init__(self, environ):
         webob.Request.__init__(self, environ)
+        # name -> (environ signature, url.URL)
+        self._urls = {}
 
     @property
     def host_url(self):
         """
         Return the host's URL, i.e. the URL of the HTTP server.
         """
-        return url.URL(super(Request, self).host_url)
+        return self._cached_url('host_url')
 
     @property
     def application_url(self):
         """
         Return the WSGI application's URL.
         """
-        return url.URL(super(Request, self).application_url)
+        return self._cached_url('application_url')
 
     @property
     def application_path(self):
@@ -51,14 +54,14 @@ class Request(webob.Request):
         """
         Return the path's URL, i.e. the current URL without the query string.
         """
-        return url.URL(super(Request, self).path_url)
+        return self._cached_url('path_url')
 
     @property
     def url(self):
         """
         Return the full current (i.e. requested), URL.
         """
-        return url.URL(super(Request, self).url)
+        return self._cached_url('url')
 
     @property
     def path(self):
@@ -66,7 +69,7 @@ class Request(webob.Request):
         Return the path part of the current URL, relative to the root of the
         web server.
         """
-        return url.URL(super(Request, self).path)
+        return self._cached_url('path')
 
     @property
     def path_qs(self):
@@ -74,10 +77,102 @@ class Request(webob.Request):
         Return the path of the current URL, relative to the root of the web
         server, and the query string.
         """
-        return url.URL(super(Request, self).path_qs)
+        return self._cached_url('path_qs')
+
+    def _cached_url(self, name):
+        """
+        Return the webob property name as a url.URL, built once for as long
+        as the environ keys it comes from stay the same.
+        """
+        environ = self.environ
+        signature = tuple([environ.get(key) for key in _URL_ENVIRON_KEYS])
+        cached = self._urls.get(name)
+        if cached is None or cached[0] != signature:
+            cached = signature, url.URL(getattr(super(Request, self), name))
+            self._urls[name] = cached
+        return cached[1]
+
+
+# The environ keys the URL properties of webob.Request are built from.
+_URL_ENVIRON_KEYS = ('wsgi.url_scheme', 'HTTP_HOST', 'SERVER_NAME',
+                     'SERVER_PORT', 'SCRIPT_NAME', 'PATH_INFO', 'QUERY_STRING')
 
 
-class Response(webob.Response):
+class LazyRequest(object):
+    """
+    HTTP request reading the method and the path straight from the WSGI
+    environ, and creating the Request it stands for the first time anything
+    else, like the headers, body, params or cookies, is used.
+
+    The attributes of the Request are read and set through the LazyRequest,
+    which is not a Request instance itself. The charset set before the Request
+    is created is only given to it then.
+    """
+
+    __slots__ = ('environ', '_request', '_charset')
+
+    def __init__(self, environ):
+        object.__setattr__(self, 'environ', environ)
+        object.__setattr__(self, '_request', None)
+        object.__setattr__(self, '_charset', None)
+
+    def _get_method(self):
+        return self.environ['REQUEST_METHOD']
+
+    def _set_method(self, method):
+        self.environ['REQUEST_METHOD'] = method
+
+    method = property(_get_method, _set_method)
+
+    @property
+    def script_name(self):
+        return self.environ.get('SCRIPT_NAME', '')
+
+    @property
+    def path_info(self):
+        return self.environ.get('PATH_INFO', '')
+
+    @property
+    def request(self):
+        """
+        The Request, created on first use.
+        """
+        request = self._request
+        if request is None:
+            request = Request(self.environ)
+            if self._charset is not None:
+                request.charset = self._charset
+            object.__setattr__(self, '_request', request)
+        return request
+
+    def __getattr__(self, name):
+        request = self._request
+        if request is None:
+            request = self.request
+        return getattr(request, name)
+
+    def __setattr__(self, name, value):
+        if name == 'method':
+            object.__setattr__(self, name, value)
+        elif name == 'charset' and self._request is None:
+            object.__setattr__(self, '_charset', value)
+        else:
+            setattr(self.request, name, value)
+
+
+class BaseResponse(object):
+    """
+    Base class of the HTTP responses, the objects ending the traversal of the
+    resources.
+
+    A response has the status, headerlist and app_iter attributes that
+    RestishApp sends to the WSGI server.
+    """
+
+    __slots__ = ()
+
+
+class Response(webob.Response, BaseResponse):
     """
     HTTP response class.
 
@@ -102,8 +197,7 @@ class Response(webob.Response):
         charset = None
         content_length = None
         if body is None:
-            header_dict = dict([(key.lower(), val) for (key, val) in headers])
-            content_length = header_dict.get('content-length')
+            content_length = _HeadersView(headers).get('content-length')
         elif isinstance(body, basestring):
             if isinstance(body, unicode):
                 kwargs['charset'] = 'utf-8'
@@ -120,6 +214,217 @@ class Response(webob.Response):
             self.headers['Content-Length'] = content_length
 
 
+class FrozenResponse(BaseResponse):
+    """
+    Immutable HTTP response, for the constant responses shared by the
+    requests.
+
+    The status, headers and body bytes are computed once, when the response is
+    created, and sent as they are, without webob. A Content-Length header is
+    added unless the body is None, a response without a body whose headers
+    are kept as given, as for Response.
+
+    The headers and body can be read, not changed: copy() returns a Response
+    that can.
+    """
+
+    __slots__ = ('_status', '_headerlist', '_body', '_app_iter')
+
+    def __init__(self, status, headers, body=''):
+        headerlist = tuple(headers)
+        if body is None:
+            app_iter = ()
+        elif isinstance(body, str):
+            if _HeadersView(headerlist).get('content-length') is None:
+                headerlist += (('Content-Length', str(len(body))),)
+            app_iter = (body,)
+        else:
+            raise TypeError('the body of a FrozenResponse must be a str')
+        self._status = status
+        self._headerlist = headerlist
+        self._body = body
+        self._app_iter = app_iter
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self._status)
+
+    def __call__(self, environ, start_response):
+        """
+        WSGI application sending the response.
+        """
+        start_response(self._status, list(self._headerlist))
+        return self._app_iter
+
+    @property
+    def status(self):
+        return self._status
+
+    @property
+    def status_int(self):
+        return int(self._status.split(' ', 1)[0])
+
+    @property
+    def headerlist(self):
+        """
+        Copy of the (name, value) headers, for the WSGI server to change.
+        """
+        return list(self._headerlist)
+
+    @property
+    def headers(self):
+        return _HeadersView(self._headerlist)
+
+    @property
+    def body(self):
+        return self._body or ''
+
+    @property
+    def app_iter(self):
+        return self._app_iter
+
+    def copy(self):
+        """
+        Return a Response with the same status, headers and body.
+        """
+        return Response(self._status, list(self._headerlist), self._body)
+
+
+class SimpleResponse(BaseResponse):
+    """
+    Slim HTTP response, for a str or iterable body: its status, headerlist
+    and app_iter are plain attributes, sent as they are, without webob.
+
+    A Content-Length header is added for a str body. The headers can be read
+    and changed through the headers view of the list, and the body through the
+    body property, reading which joins an iterable body.
+    """
+
+    __slots__ = ('status', 'headerlist', 'app_iter')
+
+    def __init__(self, status, headers, body=''):
+        headerlist = list(headers)
+        if body is None:
+            app_iter = []
+        elif isinstance(body, str):
+            if _HeadersView(headerlist).get('content-length') is None:
+                headerlist.append(('Content-Length', str(len(body))))
+            app_iter = [body]
+        elif isinstance(body, unicode):
+            raise TypeError('the body of a SimpleResponse cannot be unicode')
+        else:
+            app_iter = body
+        self.status = status
+        self.headerlist = headerlist
+        self.app_iter = app_iter
+
+    def __repr__(self):
+        return '<%s %s>' % (self.__class__.__name__, self.status)
+
+    def __call__(self, environ, start_response):
+        """
+        WSGI application sending the response.
+        """
+        start_response(self.status, self.headerlist)
+        return self.app_iter
+
+    @property
+    def status_int(self):
+        return int(self.status.split(' ', 1)[0])
+
+    @property
+    def headers(self):
+        return _Headers(self.headerlist)
+
+    def _get_body(self):
+        app_iter = self.app_iter
+        if app_iter.__class__ is list and len(app_iter) == 1:
+            return app_iter[0]
+        body = ''.join(app_iter)
+        self.app_iter = [body]
+        return body
+
+    def _set_body(self, body):
+        if not isinstance(body, str):
+            raise TypeError('the body of a SimpleResponse must be a str')
+        self.app_iter = [body]
+        self.headers['Content-Length'] = str(len(body))
+
+    body = property(_get_body, _set_body)
+
+
+def freeze(response):
+    """
+    Return a FrozenResponse with the status, headers and body of a Response.
+    """
+    return FrozenResponse(response.status, response.headerlist, response.body)
+
+
+class _HeadersView(object):
+    """
+    Read-only view of a list of (name, value) headers, their names case
+    insensitive. The last value of a repeated header wins, as for webob.
+    """
+
+    __slots__ = ('_headerlist',)
+
+    def __init__(self, headerlist):
+        self._headerlist = headerlist
+
+    def __getitem__(self, name):
+        name = name.lower()
+        for key, value in reversed(self._headerlist):
+            if key.lower() == name:
+                return value
+        raise KeyError(name)
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def getall(self, name):
+        name = name.lower()
+        return [value for key, value in self._headerlist
+                if key.lower() == name]
+
+    def __contains__(self, name):
+        return self.get(name) is not None
+
+    def __iter__(self):
+        return (key for key, value in self._headerlist)
+
+    def __len__(self):
+        return len(self._headerlist)
+
+    def keys(self):
+        return [key for key, value in self._headerlist]
+
+    def items(self):
+        return list(self._headerlist)
+
+
+class _Headers(_HeadersView):
+    """
+    View of a list of (name, value) headers, their names case insensitive,
+    changing the list. Setting a header replaces all its values.
+    """
+
+    __slots__ = ()
+
+    def __setitem__(self, name, value):
+        del self[name]
+        self._headerlist.append((name, value))
+
+    def __delitem__(self, name):
+        lower = name.lower()
+        self._headerlist[:] = [(key, value) for key, value in self._headerlist
+                               if key.lower() != lower]
+
+    def add(self, name, value):
+        self._headerlist.append((name, value))
+
+
 # Successful 2xx
 
 def ok(headers, body=''):
@@ -284,6 +589,9 @@ def see_other(location, headers=None):
     return _redirect("303 See Other", location, headers)
 
 
+_NOT_MODIFIED = FrozenResponse("304 Not Modified", [], '')
+
+
 def not_modified(headers=None):
     """
     304 Not Modified
@@ -322,12 +630,73 @@ def not_modified(headers=None):
     response.
     """
     if headers is None:
-        headers = []
+        return _NOT_MODIFIED
     return Response("304 Not Modified", headers, None)
 
 
+# An entity tag or *, in an If-None-Match header.
+_ENTITY_TAG = re.compile(r'\*|(?:W/)?"[^"]*"')
+
+
+def is_not_modified(environ, etag=None, last_modified=None):
+    """
+    Tell whether the conditional headers of a GET or HEAD request match the
+    entity tag, like '"v42"' or 'W/"v42"', and the last modification, in
+    seconds since the epoch, either of them being None when unknown: the
+    client's copy is fresh and not_modified() can be sent instead.
+
+    If-None-Match uses the weak comparison, as GET and HEAD requests do, and
+    If-Modified-Since is only looked at without it.
+    """
+    if_none_match = environ.get('HTTP_IF_NONE_MATCH')
+    if if_none_match is not None:
+        tags = _ENTITY_TAG.findall(if_none_match)
+        if '*' in tags:
+            return True
+        if etag is None:
+            return False
+        etag = _weak(etag)
+        for tag in tags:
+            if _weak(tag) == etag:
+                return True
+        return False
+    if_modified_since = environ.get('HTTP_IF_MODIFIED_SINCE')
+    if if_modified_since is None or last_modified is None:
+        return False
+    since = _parse_http_date(if_modified_since)
+    return since is not None and last_modified <= since
+
+
+def _weak(etag):
+    """
+    Return the opaque tag of the entity tag, without the weakness indicator.
+    """
+    if etag.startswith('W/'):
+        return etag[2:]
+    return etag
+
+
+def _parse_http_date(value):
+    """
+    Return the seconds since the epoch of the HTTP date, or None when it is
+    not one.
+    """
+    from email import utils
+    parsed = utils.parsedate_tz(value)
+    if parsed is None:
+        return None
+    try:
+        return utils.mktime_tz(parsed)
+    except (OverflowError, ValueError):
+        return None
+
+
 # Client Error 4xx
 
+_BAD_REQUEST = FrozenResponse(
+        "400 Bad Request", [('Content-Type', 'text/plain')], "400 Bad Request")
+
+
 def bad_request(headers=None, body=None):
     """
     400 Bad Request
@@ -336,8 +705,7 @@ def bad_request(headers=None, body=None):
     The client SHOULD NOT repeat the request without modifications.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '400 Bad Request'
+        return _BAD_REQUEST
     return Response("400 Bad Request", headers, body)
 
 
@@ -371,6 +739,10 @@ class UnauthorizedError(error.HTTPClientError):
     response_factory = staticmethod(unauthorized)
 
 
+_FORBIDDEN = FrozenResponse(
+        "403 Forbidden", [('Content-Type', 'text/plain')], "403 Forbidden")
+
+
 def forbidden(headers=None, body=None):
     """
     403 Forbidden
@@ -384,8 +756,7 @@ def forbidden(headers=None, body=None):
     instead.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '403 Forbidden'
+        return _FORBIDDEN
     return Response("403 Forbidden", headers, body)
 
 
@@ -394,6 +765,10 @@ class ForbiddenError(error.HTTPClientError):
     response_factory = staticmethod(forbidden)
 
 
+_NOT_FOUND = FrozenResponse(
+        "404 Not Found", [('Content-Type', 'text/plain')], "404 Not Found")
+
+
 def not_found(headers=None, body=None):
     """
     404 Not Found
@@ -407,8 +782,7 @@ def not_found(headers=None, body=None):
     when no other response is applicable.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '404 Not Found'
+        return _NOT_FOUND
     return Response("404 Not Found", headers, body)
 
 
@@ -427,10 +801,18 @@ def method_not_allowed(allow):
     """
     if isinstance(allow, list):
         allow = ', '.join(allow)
-    return Response("405 Method Not Allowed",
-                    [('Content-Type', 'text/plain'),
-                     ('Allow', allow)],
-                    "405 Method Not Allowed")
+    response = _METHOD_NOT_ALLOWED.get(allow)
+    if response is None:
+        response = FrozenResponse("405 Method Not Allowed",
+                                  [('Content-Type', 'text/plain'),
+                                   ('Allow', allow)],
+                                  "405 Method Not Allowed")
+        _METHOD_NOT_ALLOWED.set(allow, response)
+    return response
+
+
+# Allow -> 405 FrozenResponse
+_METHOD_NOT_ALLOWED = cache.LRUCache(100)
 
 
 class MethodNotAllowedError(error.HTTPClientError):
@@ -438,7 +820,12 @@ class MethodNotAllowedError(error.HTTPClientError):
     response_factory = staticmethod(method_not_allowed)
 
 
-def not_acceptable(headers, body):
+_NOT_ACCEPTABLE = FrozenResponse(
+        '406 Not Acceptable', [('Content-Type', 'text/plain')],
+        '406 Not Acceptable')
+
+
+def not_acceptable(headers=None, body=None):
     """
     406 Not Acceptable
 
@@ -464,6 +851,8 @@ def not_acceptable(headers, body):
     If the response could be unacceptable, a user agent SHOULD temporarily stop
     receipt of more data and query the user for a decision on further actions.
     """
+    if headers is None and body is None:
+        return _NOT_ACCEPTABLE
     return Response('406 Not Acceptable', headers, body)
 
 
@@ -502,6 +891,11 @@ class ConflictError(error.HTTPClientError):
 
 # Server Error 5xx
 
+_INTERNAL_SERVER_ERROR = FrozenResponse(
+        '500 Internal Server Error', [('Content-Type', 'text/plain')],
+        '500 Internal Server Error')
+
+
 def internal_server_error(headers=None, body=None):
     """
     500 Internal Server Error.
@@ -510,8 +904,7 @@ def internal_server_error(headers=None, body=None):
     fulfilling the request.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '500 Internal Server Error'
+        return _INTERNAL_SERVER_ERROR
     return Response('500 Internal Server Error', headers, body)
 
 
@@ -522,6 +915,10 @@ class InternalServerError(error.HTTPServerError):
     response_factory = staticmethod(internal_server_error)
 
 
+_BAD_GATEWAY = FrozenResponse(
+        '502 Bad Gateway', [('Content-Type', 'text/plain')], '502 Bad Gateway')
+
+
 def bad_gateway(headers=None, body=None):
     """
     502 Bad Gateway.
@@ -531,8 +928,7 @@ def bad_gateway(headers=None, body=None):
     request.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '502 Bad Gateway'
+        return _BAD_GATEWAY
     return Response('502 Bad Gateway', headers, body)
 
 
@@ -543,6 +939,11 @@ class BadGatewayError(error.HTTPServerError):
     response_factory = staticmethod(bad_gateway)
 
 
+_SERVICE_UNAVAILABLE = FrozenResponse(
+        '503 Service Unavailable', [('Content-Type', 'text/plain')],
+        '503 Service Unavailable')
+
+
 def service_unavailable(headers=None, body=None):
     """
     503 Service Unavailable.
@@ -555,8 +956,7 @@ def service_unavailable(headers=None, body=None):
     a 500 response.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '503 Service Unavailable'
+        return _SERVICE_UNAVAILABLE
     return Response('503 Service Unavailable', headers, body)
 
 
@@ -567,6 +967,11 @@ class ServiceUnavailableError(error.HTTPServerError):
     response_factory = staticmethod(service_unavailable)
 
 
+_GATEWAY_TIMEOUT = FrozenResponse(
+        '504 Gateway Timeout', [('Content-Type', 'text/plain')],
+        '504 Gateway Timeout')
+
+
 def gateway_timeout(headers=None, body=None):
     """
     504 Gateway Timeout.
@@ -577,8 +982,7 @@ def gateway_timeout(headers=None, body=None):
     attempting to complete the request.
     """
     if headers is None and body is None:
-        headers = [('Content-Type', 'text/plain')]
-        body = '504 Gateway Timeout'
+        return _GATEWAY_TIMEOUT
     return Response('504 Gateway Timeout', headers, body)
 
 
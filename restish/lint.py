@@ -0,0 +1,588 @@
+"""
+Analysis of the child matchers of the resource classes.
+
+Reports the matchers that can never be reached, the matchers of equal score
+whose order is left to chance, and the regexes at risk of catastrophic
+backtracking or too slow on a worst-case segment.
+
+From the command line, importing the modules declaring the resources::
+
+    python -m restish.lint mypackage.resources [mypackage.root:Root ...]
+
+Or at the bottom of the module declaring the resources, raising on any
+problem in strict mode::
+
+    lint.check(strict=True)
+"""
+
+import optparse
+import re
+import sre_constants
+import sre_parse
+import sys
+import timeit
+import warnings
+
+from restish import error, resource
+
+
+# Longest run of a repeated character in the worst-case segments.
+LENGTH = 20
+# Seconds a single match may take.
+MAX_COST = 0.001
+
+_UNBOUNDED = sre_constants.MAXREPEAT
+_REPEATS = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+_CATEGORIES = dict((category, set(ord(char) for char in chars))
+                   for category, chars in [
+        (sre_constants.CATEGORY_DIGIT, '0123456789'),
+        (sre_constants.CATEGORY_SPACE, ' \t\n\r\f\v'),
+        (sre_constants.CATEGORY_WORD, 'abcdefghijklmnopqrstuvwxyz'
+                                      'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_'),
+        ])
+# Regexes of the dynamic segments matching any segment.
+_ANYTHING = ('(?:[^/]+)', '(?:.+)')
+# Flags changing the characters a regex matches.
+_FLAGS = sre_constants.SRE_FLAG_IGNORECASE | sre_constants.SRE_FLAG_LOCALE | \
+        sre_constants.SRE_FLAG_UNICODE
+_NAMED_GROUP = re.compile(r'\(\?P<[^>]*>')
+
+
+class Problem(object):
+    """
+    A problem found with a child matcher of a resource class.
+
+    kind is one of 'invalid', 'unreachable', 'ambiguous', 'backtracking' or
+    'slow'; other is the matcher causing it, if any.
+    """
+
+    def __init__(self, kind, cls, matcher, message, other=None):
+        self.kind = kind
+        self.cls = cls
+        self.matcher = matcher
+        self.message = message
+        self.other = other
+
+    def __repr__(self):
+        return '<Problem %s %r>' % (self.kind, self.matcher)
+
+    def __str__(self):
+        return '%s.%s: %s' % (self.cls.__module__, self.cls.__name__,
+                              self.message)
+
+
+class RouteError(error.RestishException):
+    """
+    Raised by check in strict mode, with the problems found.
+    """
+
+    def __init__(self, problems):
+        error.RestishException.__init__(
+            self, '\n'.join(str(problem) for problem in problems))
+        self.problems = problems
+
+
+class RouteWarning(UserWarning):
+    """
+    Warning of check for each problem found.
+    """
+
+
+def lint(classes=None, max_cost=MAX_COST):
+    """
+    Return the problems of the child matchers of the resource classes and of
+    the classes below them, all the registered classes by default.
+    """
+    problems = []
+    for cls in _walk(classes):
+        problems.extend(lint_class(cls, max_cost))
+    return problems
+
+
+def check(classes=None, strict=False, max_cost=MAX_COST):
+    """
+    Warn about the problems of the child matchers, or raise RouteError in
+    strict mode. Return the problems.
+    """
+    problems = lint(classes, max_cost)
+    if problems and strict:
+        raise RouteError(problems)
+    for problem in problems:
+        warnings.warn(str(problem), RouteWarning, stacklevel=2)
+    return problems
+
+
+def lint_class(cls, max_cost=MAX_COST):
+    """
+    Return the problems of the child matchers of a single resource class.
+    """
+    problems = []
+    matchers = [matcher for matcher, func in cls.child_factories]
+    for i, matcher in enumerate(matchers):
+        # The child factories are sorted by score, so only the earlier ones
+        # of equal score (or any) might hide it.
+        for other in matchers[:i]:
+            if _covers(other, matcher):
+                problems.append(Problem('unreachable', cls, matcher,
+                    '%r is hidden by %r' % (matcher, other), other))
+                break
+            if other.score == matcher.score and \
+                    not disjoint(other, matcher):
+                problems.append(Problem('ambiguous', cls, matcher,
+                    '%r and %r have the same score and may match the same '
+                    'segments' % (other, matcher), other))
+        if not isinstance(matcher, resource.TemplateChildMatcher):
+            continue
+        # The templates are only compiled on first use.
+        try:
+            matcher._compile()
+        except re.error, e:
+            problems.append(Problem('invalid', cls, matcher,
+                                    '%r: %s' % (matcher, e)))
+            continue
+        for segment, regex in _dynamic_segments(matcher):
+            try:
+                risky = backtracking(regex)
+            except re.error:
+                # Only valid along with the other segments, like a reference
+                # to their groups.
+                continue
+            if risky:
+                problems.append(Problem('backtracking', cls, matcher,
+                    '%r: %r may backtrack catastrophically' % (matcher,
+                                                               segment)))
+                continue
+            seconds = _cost(segment, regex)
+            if seconds is not None and seconds > max_cost:
+                problems.append(Problem('slow', cls, matcher,
+                    '%r: %r takes %.2fms on a worst-case segment' % (
+                        matcher, segment, seconds * 1e3)))
+    return problems
+
+
+def cost(matcher, length=LENGTH):
+    """
+    Return the seconds a template matcher takes on the worst-case segment of
+    its slowest dynamic segment, or None when its regex is invalid.
+    """
+    try:
+        matcher._compile()
+    except re.error:
+        return None
+    costs = [_cost(segment, regex, length)
+             for segment, regex in _dynamic_segments(matcher)]
+    return max([seconds for seconds in costs if seconds is not None] or
+               [0.0])
+
+
+def backtracking(regex):
+    """
+    Tell whether the regex may backtrack catastrophically, i.e. whether it
+    repeats something that can itself be split in several ways.
+    """
+    return _nested_repeats(sre_parse.parse(regex))
+
+
+def _walk(classes):
+    """
+    Return the classes and the classes declared below them, sorted by name.
+    """
+    if classes is None:
+        classes = resource.Resource._resources.values()
+        classes += [cls._parent for cls in classes if hasattr(cls, '_parent')]
+    seen = set()
+    stack = list(classes)
+    while stack:
+        cls = stack.pop()
+        if cls in seen:
+            continue
+        seen.add(cls)
+        for matcher, func in cls.child_factories:
+            child_class = getattr(func, resource._RESTISH_CHILD_CLASS, None)
+            if child_class is not None:
+                stack.append(child_class)
+    return sorted(seen, key=lambda cls: (cls.__module__, cls.__name__))
+
+
+def _dynamic_segments(matcher):
+    """
+    Generate the (segment, regex) of the dynamic segments of a template.
+    """
+    for segment in matcher.pattern.split(matcher.SPLITTER):
+        if matcher._is_dynamic(segment):
+            regex = _NAMED_GROUP.sub('(?:', matcher._segment_regex(segment))
+            yield segment, regex
+
+
+def _shape(matcher):
+    """
+    Return the segments of a template as (literal, text) tuples, the text of
+    the dynamic segments being their regex.
+    """
+    shape = []
+    for segment in matcher.pattern.split(matcher.SPLITTER):
+        if matcher._is_dynamic(segment):
+            shape.append((False, _NAMED_GROUP.sub('(?:',
+                                                  matcher._segment_regex(segment))))
+        else:
+            shape.append((True, segment))
+    return shape
+
+
+def _covers(matcher, other):
+    """
+    Tell whether matcher surely matches whatever other matches.
+    """
+    if isinstance(matcher, resource.AnyChildMatcher):
+        return True
+    if not isinstance(matcher, resource.TemplateChildMatcher) or \
+            not isinstance(other, resource.TemplateChildMatcher):
+        return False
+    shape, other_shape = _shape(matcher), _shape(other)
+    if len(shape) != len(other_shape):
+        return False
+    for (literal, text), (other_literal, other_text) in zip(shape,
+                                                           other_shape):
+        if literal != other_literal or text != other_text:
+            if literal or text not in _ANYTHING or (other_literal and
+                                               not other_text):
+                return False
+    return True
+
+
+def disjoint(matcher, other):
+    """
+    Tell whether the matchers surely never match the same segments, i.e.
+    whether their order does not matter.
+    """
+    if not isinstance(matcher, resource.TemplateChildMatcher) or \
+            not isinstance(other, resource.TemplateChildMatcher):
+        return False
+    shapes = []
+    for template in matcher, other:
+        shape = []
+        for literal, text in _shape(template):
+            parsed = None
+            if not literal:
+                try:
+                    parsed = sre_parse.parse(text)
+                except sre_constants.error:
+                    return False
+                # The flags apply to the whole template.
+                if parsed.pattern.flags & _FLAGS:
+                    return False
+            shape.append((literal, text, parsed))
+        shapes.append(shape)
+    for (literal, text, parsed), (other_literal, other_text, other_parsed) in \
+            zip(*shapes):
+        if literal and other_literal:
+            if text != other_text:
+                return True
+        else:
+            first = _segment_first(literal, text, parsed)
+            other_first = _segment_first(other_literal, other_text,
+                                         other_parsed)
+            if first is not None and other_first is not None and \
+                    not first & other_first:
+                return True
+        # The next segments only line up when these cannot match a '/'.
+        if (parsed is not None and _slash(parsed)) or \
+                (other_parsed is not None and _slash(other_parsed)):
+            return False
+    return False
+
+
+def _segment_first(literal, text, parsed):
+    """
+    Return the set of the characters a segment surely starts with, or None.
+    """
+    if literal:
+        return set(ord(char) for char in text[:1]) or None
+    chars, empty = _first(parsed)
+    if empty:
+        return None
+    return chars
+
+
+def _slash(pattern):
+    """
+    Tell whether a parsed regex may match a '/'.
+    """
+    slash = ord('/')
+    for op, av in pattern:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.LITERAL:
+            if av == slash:
+                return True
+        elif op is sre_constants.NOT_LITERAL:
+            if av != slash:
+                return True
+        elif op is sre_constants.IN:
+            negate = av[:1] == [(sre_constants.NEGATE, None)]
+            chars = _item_chars(op, av[negate:])
+            if chars is None or (slash in chars) != negate:
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _slash(av[-1]):
+                return True
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                if _slash(branch):
+                    return True
+        elif op in _REPEATS:
+            if _slash(av[2]):
+                return True
+        else:
+            return True
+    return False
+
+
+def _item_chars(op, av):
+    """
+    Return the set of the codes of the characters a single character item
+    matches, or None when it is not one or matches about anything.
+    """
+    if op is sre_constants.LITERAL:
+        return set([av])
+    if op is not sre_constants.IN:
+        return None
+    chars = set()
+    for item_op, item_av in av:
+        if item_op is sre_constants.LITERAL:
+            chars.add(item_av)
+        elif item_op is sre_constants.RANGE:
+            chars.update(xrange(item_av[0], item_av[1] + 1))
+        elif item_op is sre_constants.CATEGORY and item_av in _CATEGORIES:
+            chars.update(_CATEGORIES[item_av])
+        else:
+            return None
+    return chars
+
+
+def _first(pattern):
+    """
+    Return (characters, empty) for a parsed regex: the set of the codes of the
+    characters it can start with, or None when it can start with about anything, and
+    whether it can match the empty string.
+    """
+    chars = set()
+    for op, av in pattern:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.SUBPATTERN:
+            item_chars, empty = _first(av[-1])
+        elif op is sre_constants.BRANCH:
+            item_chars, empty = set(), False
+            for branch in av[1]:
+                branch_chars, branch_empty = _first(branch)
+                if branch_chars is None:
+                    return None, True
+                item_chars |= branch_chars
+                empty = empty or branch_empty
+        elif op in _REPEATS:
+            item_chars, empty = _first(av[2])
+            empty = empty or av[0] == 0
+        else:
+            item_chars, empty = _item_chars(op, av), False
+        if item_chars is None:
+            return None, True
+        chars |= item_chars
+        if not empty:
+            return chars, False
+    return chars, True
+
+
+def _chars(pattern):
+    """
+    Return the set of the codes of all the characters a parsed regex can
+    match, or None.
+    """
+    chars = set()
+    for op, av in pattern:
+        if op is sre_constants.AT:
+            continue
+        if op is sre_constants.SUBPATTERN:
+            item_chars = _chars(av[-1])
+        elif op is sre_constants.BRANCH:
+            item_chars = set()
+            for branch in av[1]:
+                branch_chars = _chars(branch)
+                if branch_chars is None:
+                    return None
+                item_chars |= branch_chars
+        elif op in _REPEATS:
+            item_chars = _chars(av[2])
+        else:
+            item_chars = _item_chars(op, av)
+        if item_chars is None:
+            return None
+        chars |= item_chars
+    return chars
+
+
+def _overlap(chars, other):
+    return chars is None or other is None or bool(chars & other)
+
+
+def _nested_repeats(pattern):
+    """
+    Tell whether a parsed regex has an unbounded repeat whose body can be
+    split in several ways.
+    """
+    for op, av in pattern:
+        if op in _REPEATS:
+            if av[1] == _UNBOUNDED and \
+                    _ambiguous_body(av[2], _first(av[2])[0]):
+                return True
+            if _nested_repeats(av[2]):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _nested_repeats(av[-1]):
+                return True
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                if _nested_repeats(branch):
+                    return True
+    return False
+
+
+def _ambiguous_body(pattern, first):
+    """
+    Tell whether the body of a repeat, starting with the first characters,
+    ends with something of variable width that could as well start the next
+    iteration, or with overlapping alternatives.
+    """
+    for op, av in reversed(list(pattern)):
+        if op is sre_constants.AT:
+            continue
+        item = sre_parse.SubPattern(pattern.pattern, [(op, av)])
+        low, high = item.getwidth()
+        if low != high and op is not sre_constants.SUBPATTERN and \
+                _overlap(_chars(item), first):
+            return True
+        if op in _REPEATS:
+            if _ambiguous_body(av[2], first):
+                return True
+        elif op is sre_constants.SUBPATTERN:
+            if _ambiguous_body(av[-1], first):
+                return True
+        elif op is sre_constants.BRANCH:
+            firsts = [_first(branch)[0] for branch in av[1]]
+            for i, chars in enumerate(firsts):
+                for other in firsts[:i]:
+                    if _overlap(chars, other):
+                        return True
+            for branch in av[1]:
+                if _ambiguous_body(branch, first):
+                    return True
+        if low:
+            return False
+    return False
+
+
+def _pump(pattern):
+    """
+    Return the code of a character to repeat to make the regex work hard, or
+    None.
+    """
+    for op, av in pattern:
+        if op in _REPEATS:
+            if av[1] == _UNBOUNDED:
+                chars = _chars(av[2])
+                return min(chars) if chars else ord('a')
+            return _pump(av[2])
+        if op is sre_constants.SUBPATTERN:
+            char = _pump(av[-1])
+            if char is not None:
+                return char
+        elif op is sre_constants.BRANCH:
+            for branch in av[1]:
+                char = _pump(branch)
+                if char is not None:
+                    return char
+    return None
+
+
+def _cost(segment, regex, length=LENGTH):
+    """
+    Return the seconds the regex of a dynamic segment takes to fail on a long
+    run of the character it repeats, its literal prefix included, or None
+    when the regex is not valid on its own.
+    """
+    try:
+        compiled = re.compile('^(?:' + regex + ')$')
+    except re.error:
+        return None
+    prefix = segment.split(resource.TemplateChildMatcher.MARKERS[0], 1)[0]
+    code = _pump(sre_parse.parse(regex))
+    if code is None:
+        code = ord('a')
+    if isinstance(segment, unicode):
+        char = unichr(code)
+    else:
+        char = chr(code % 256)
+    worst = 0.0
+    for tail in ['\x00', '!', '/']:
+        text = prefix + char * length + tail
+        if compiled.match(text):
+            continue
+        timer = timeit.Timer(lambda: compiled.match(text))
+        worst = max(worst, min(timer.repeat(repeat=3, number=1)))
+    return worst
+
+
+def _resolve(name):
+    """
+    Import a module and return its resource class given as module:Class, or
+    None for all the registered classes.
+    """
+    module, _, attr = name.partition(':')
+    __import__(module)
+    if attr:
+        return getattr(sys.modules[module], attr)
+    return None
+
+
+def main(argv=None):
+    """
+    Lint the resources of the modules given on the command line, returning 1
+    when a problem was found.
+    """
+    parser = optparse.OptionParser(
+        usage='%prog [options] module[:Class] ...',
+        description='Report the problems of the child matchers of the '
+                    'resources declared in the modules.')
+    parser.add_option('--max-cost', type='float', default=MAX_COST * 1e3,
+                      help='milliseconds a match may take [%default]')
+    parser.add_option('-v', '--verbose', action='store_true', default=False,
+                      help='print the cost of every template')
+    options, args = parser.parse_args(argv)
+    if not args:
+        parser.error('no module given')
+    classes = []
+    for name in args:
+        cls = _resolve(name)
+        if cls is not None:
+            classes.append(cls)
+    classes = classes or None
+    if options.verbose:
+        for cls in _walk(classes):
+            for matcher, func in cls.child_factories:
+                if isinstance(matcher, resource.TemplateChildMatcher):
+                    seconds = cost(matcher)
+                    if seconds is None:
+                        # Reported below.
+                        seconds = 'invalid'
+                    else:
+                        seconds = '%.3fms' % (seconds * 1e3)
+                    print '%s.%s: %r %s' % (cls.__module__, cls.__name__,
+                                            matcher, seconds)
+    problems = lint(classes, options.max_cost / 1e3)
+    for problem in problems:
+        print problem
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
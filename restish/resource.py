@@ -2,17 +2,42 @@
 Base Resource class and associates methods for children and content negotiation
 """
 
-import mimetypes
 import re
 import mimeparse
 
-from restish import http, url
+from restish import cache, http, url
 
 
 _RESTISH_CHILD = "restish_child"
 _RESTISH_METHOD = "restish_method"
 _RESTISH_MATCH = "restish_match"
 _RESTISH_CHILD_CLASS = "restish_child_class"
+_RESTISH_CHILD_WITH_PARENT = "restish_child_with_parent"
+_RESTISH_HOOK = "restish_hook"
+
+
+# Media types of the common short names, tried before the mimetypes module
+# and the system database it reads. Only the names the platforms agree on.
+SHORT_CONTENT_TYPES = {
+        'atom': 'application/atom+xml',
+        'css': 'text/css',
+        'csv': 'text/csv',
+        'gif': 'image/gif',
+        'htm': 'text/html',
+        'html': 'text/html',
+        'jpeg': 'image/jpeg',
+        'jpg': 'image/jpeg',
+        'json': 'application/json',
+        'pdf': 'application/pdf',
+        'png': 'image/png',
+        'rdf': 'application/rdf+xml',
+        'svg': 'image/svg+xml',
+        'text': 'text/plain',
+        'txt': 'text/plain',
+        'xhtml': 'application/xhtml+xml',
+        'xml': 'application/xml',
+        'zip': 'application/zip',
+        }
 
 
 SHORT_CONTENT_TYPE_EXTRA = {
@@ -23,6 +48,86 @@ SHORT_CONTENT_TYPE_EXTRA = {
 PYTHON_STRING_VARS = re.compile(r"%\(([^\)]+)\)s")
 
 
+def _uuid(value):
+    """
+    Return the uuid.UUID of the value, importing uuid (and ctypes) on first
+    use.
+    """
+    import uuid
+    return uuid.UUID(value)
+
+
+_DIGITS = '0123456789'
+_HEXDIGITS = '0123456789abcdefABCDEF'
+_SLUG = '-_abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789'
+
+
+def _parse_int(text):
+    """
+    Return the int of the ASCII digits, or None.
+    """
+    if text and not text.lstrip(_DIGITS):
+        return int(text)
+    return None
+
+
+def _parse_uuid(text):
+    """
+    Return the uuid.UUID of the 8-4-4-4-12 hex digits, or None.
+    """
+    if len(text) == 36 and \
+            text[8] == text[13] == text[18] == text[23] == '-':
+        digits = text.replace('-', '')
+        if len(digits) == 32 and not digits.lstrip(_HEXDIGITS):
+            return _uuid(text)
+    return None
+
+
+def _parse_slug(text):
+    """
+    Return the text if it is a slug, or None.
+    """
+    if text and not text.lstrip(_SLUG):
+        return text
+    return None
+
+
+class Converter(object):
+    """
+    Typed {var:name} segment of a template: the regex matching the value and
+    the function converting the matched text. convert must accept anything
+    the regex matches.
+
+    parse, when given, does both without a regex: it returns the converted
+    value of a segment, or None when the regex would not match it. The child
+    index matches the templates whose dynamic segments are all such typed
+    vars with it.
+
+    A path converter matches the remaining segments, slashes included, and
+    can only end a template.
+    """
+
+    def __init__(self, regex, convert=None, path=False, parse=None):
+        self.regex = regex
+        self.convert = convert
+        self.path = path
+        self.parse = parse
+
+
+# Converters of the {var:name} template segments.
+CONVERTERS = {
+        'int': Converter('[0-9]+', int, parse=_parse_int),
+        'uuid': Converter('[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-'
+                          '[0-9a-fA-F]{4}-[0-9a-fA-F]{12}', _uuid,
+                          parse=_parse_uuid),
+        'slug': Converter('[-a-zA-Z0-9_]+', parse=_parse_slug),
+        'path': Converter('.+', path=True),
+        }
+
+# Short name -> media type of the mimetypes already expanded.
+_MIMETYPES = {}
+
+
 def child(matcher=None, klass=None, canonical=False, with_parent=False):
     if klass is None and not isinstance(matcher, _metaResource):
         """ Child decorator used for finding child resources """
@@ -48,16 +153,42 @@ def child(matcher=None, klass=None, canonical=False, with_parent=False):
         def func(self, request, segments, *args, **kwargs):
             if with_parent:
                 kwargs["_parent"] = self
-            return klass(*args, **kwargs), segments
+                return klass(*args, **kwargs), segments
+            return _create_child(klass, args, kwargs), segments
         
         if isinstance(matcher, basestring):
             matcher = TemplateChildMatcher(matcher, canonical)
         
         setattr(func, _RESTISH_CHILD, matcher)
         setattr(func, _RESTISH_CHILD_CLASS, klass)
+        setattr(func, _RESTISH_CHILD_WITH_PARENT, with_parent)
         return func
 
 
+def _create_child(klass, args, kwargs):
+    """
+    Create the child resource for the match arguments, or reuse the instance
+    created for the same arguments when the class shares its instances.
+    """
+    size = getattr(klass, 'shared_instances', 0)
+    if not size:
+        return klass(*args, **kwargs)
+    key = tuple(args), tuple(sorted(kwargs.iteritems()))
+    try:
+        hash(key)
+    except TypeError:
+        return klass(*args, **kwargs)
+    # Each class has its own cache, not the one of its base class.
+    instances = klass.__dict__.get('_shared_cache')
+    if instances is None:
+        instances = klass._shared_cache = cache.LRUCache(size)
+    instance = instances.get(key)
+    if instance is None:
+        instance = klass(*args, **kwargs)
+        instances.set(key, instance)
+    return instance
+
+
 def url_for(cls, *args, **kwargs):
     """
     Contruct an URL going up from the given resource class to the root.
@@ -79,6 +210,175 @@ def url_for(cls, *args, **kwargs):
         return Resource._url_for()
 
 
+# Resource class -> _URLFormatter, reset whenever the resource tree grows.
+_url_formatters = {}
+
+
+def _url_formatter(cls):
+    """
+    Return the _URLFormatter of the resource class.
+    """
+    formatter = _url_formatters.get(cls)
+    if formatter is None:
+        formatter = _url_formatters[cls] = _URLFormatter(cls)
+    return formatter
+
+
+class _URLFormatter(object):
+    """
+    The URL of a resource class, going up to the root, compiled into a single
+    format string.
+
+    The literal parts of the templates are quoted once, leaving only the
+    values to quote when the URL is built.
+    """
+
+    def __init__(self, cls):
+        matchers = []
+        while hasattr(cls, '_parent'):
+            matchers.append(cls._parent.child_matchers.get(cls, None))
+            cls = cls._parent
+        matchers.reverse()
+        self.matchers = matchers
+        # Format string and (name, format of the value) of its values, or
+        # None when the templates are left to their matchers.
+        self.format, self.vars = self._compile()
+
+    def _compile(self):
+        pieces, vars = [], []
+        for matcher in self.matchers:
+            if not isinstance(matcher, TemplateChildMatcher) or \
+                    matcher._count is None:
+                # Paths keep their slashes, left to the matcher.
+                return None, None
+            for segment in matcher.pattern.split(matcher.SPLITTER):
+                if not matcher._is_dynamic(segment):
+                    # The template is formatted, mind the '%'.
+                    if '%' in segment:
+                        return None, None
+                    pieces.append(url._quote_segment(segment).replace('%',
+                                                                      '%%'))
+                    continue
+                prefix, rest = segment.split(matcher.MARKERS[0], 1)
+                var, suffix = rest.rsplit(matcher.MARKERS[1], 1)
+                var = var.split(':', 1)[0]
+                if '%' in prefix + suffix or ')' in var:
+                    return None, None
+                if isinstance(segment, unicode):
+                    value_format = u'%s'
+                else:
+                    # A unicode value would not mix with these bytes.
+                    try:
+                        (prefix + suffix).decode('ascii')
+                    except UnicodeError:
+                        return None, None
+                    value_format = '%s'
+                pieces.append('%s%%s%s' % (
+                    url._quote_segment(prefix).replace('%', '%%'),
+                    url._quote_segment(suffix).replace('%', '%%')))
+                vars.append((var, value_format))
+        return '/' + '/'.join(pieces), vars
+
+    def __call__(self, *args, **kwargs):
+        """
+        Build the URL with the arguments of url_for.
+        """
+        if not self.matchers:
+            return url.URL('/')
+        if self.format is None:
+            segments = []
+            for matcher in self.matchers:
+                segments.extend(matcher._url_for(*args, **kwargs))
+            return url.URL('/').child(*segments)
+        return self._format(*args, **kwargs)
+
+    def urls(self, objects):
+        """
+        Generate the URLs of the objects, or dicts, quoting each distinct
+        value once.
+        """
+        if not self.matchers or self.format is None:
+            for obj in objects:
+                yield self(obj)
+            return
+        format, vars, URL = self.format, self.vars, url.URL
+        # (type, value) -> quoted segment, for each variable. Mind the type,
+        # 1, 1.0 and True are the same key.
+        quoted = [{} for var in vars]
+        for obj in objects:
+            is_dict = type(obj) is dict
+            values = []
+            for (var, value_format), segments in zip(vars, quoted):
+                if is_dict:
+                    value = obj[var]
+                elif hasattr(obj, var):
+                    value = getattr(obj, var)
+                else:
+                    raise KeyError(var, "url_for: key is missing")
+                key = value.__class__, value
+                try:
+                    segment = segments[key]
+                except KeyError:
+                    segment = segments[key] = \
+                            url._quote_segment(value_format % (value,))
+                except TypeError:
+                    # Unhashable value.
+                    segment = url._quote_segment(value_format % (value,))
+                values.append(segment)
+            yield URL(format % tuple(values))
+
+    def _format(self, obj=None, **kwargs):
+        if type(obj) is dict:
+            kwargs = dict(kwargs, **obj)
+            obj = None
+        values = []
+        for var, value_format in self.vars:
+            if obj is None:
+                value = kwargs[var]
+            elif hasattr(obj, var):
+                value = getattr(obj, var)
+            else:
+                raise KeyError(var, "url_for: key is missing")
+            values.append(url._quote_segment(value_format % (value,)))
+        return url.URL(self.format % tuple(values))
+
+
+def urls_for(cls, objects, lazy=False):
+    """
+    Construct the URLs of many objects, or dicts, for the given resource
+    class, resolving its templates once.
+
+    urls_for(Klass, [obj1, obj2, ...])
+    urls_for(Klass, [{"arg1": "val1"}, ...], lazy=True)
+
+    The URLs are returned in a list, or generated one by one when lazy is
+    True.
+    """
+    if isinstance(cls, basestring):
+        cls = Resource._resources.get(cls.lower(), None)
+    if cls is None:
+        cls = Resource
+    urls = _url_formatter(cls).urls(objects)
+    if lazy:
+        return urls
+    return list(urls)
+
+
+def child_stats(cls):
+    """
+    Return the (matcher, hits) of the child factories of a resource class, the
+    most hit first. The hits are only counted when the adaptive_child_order
+    of the class is set.
+    """
+    stats = cls.__dict__.get('_child_hits')
+    hits = {}
+    if stats is not None:
+        hits = stats.hits
+    return sorted([(matcher, hits.get(func, 0))
+                   for matcher, func in cls.child_factories],
+                  key=lambda item: item[1], reverse=True)
+
+
 def redirect(fro, to=None):
     if not isinstance(fro, _metaResource) and not isinstance(to, _metaResource):
         def decorator(func):
@@ -125,57 +425,130 @@ class TemplateChildMatcher(object):
         self.pattern = pattern
         self.canonical = canonical
         self._calc_score()
-        self._compile()
+        self._prepare()
+        # Compiled on first use.
+        self._regex = None
 
     def __repr__(self):
         return '<TemplateChildMatcher "%s">' % self.pattern
 
+    def _is_dynamic(self, segment):
+        """Tell whether the pattern segment contains a {} marker"""
+        return len(segment) >= 2 and (segment.find(self.MARKERS[0]) +
+                                      segment.find(self.MARKERS[1]) != -2)
+
     def _calc_score(self):
         """Return the score for this element"""
         def score(segment):
-            if len(segment) >= 2 and (segment.find(self.MARKERS[0]) +
-                                      segment.find(self.MARKERS[1]) != -2):
+            if self._is_dynamic(segment):
                 return 0
             return 1
         segments = self.pattern.split(self.SPLITTER)
         self.score = tuple(score(segment) for segment in segments)
 
-    def _build_regex(self):
-        """Build the regex from the pattern"""
-        def re_segments(segments):
-            for segment in segments:
-                if len(segment) >= 2 and segment.find("{") + \
-                    segment.find("}") != -2:
-                    prefix, rest = segment.split("{", 1)
-                    var, suffix = rest.rsplit("}", 1)
-                    pos = var.find(":")
-                    # make them regexp safe
-                    prefix = re.escape(prefix)
-                    suffix = re.escape(suffix)
-                    if ~pos:
-                        regex = '%s(?P<%s>%s)%s' % (prefix,
-                                                    var[:pos],
-                                                    var[pos+1:],
-                                                    suffix)
-                    else:
-                        regex = r'%s(?P<%s>[^/]+)%s' % (prefix,
-                                                        var,
-                                                        suffix)
-                    yield regex
-                else:
-                    yield re.escape(segment)
+    def _segment_converter(self, segment):
+        """Return the Converter of a segment of the pattern, or None"""
+        if not self._is_dynamic(segment):
+            return None
+        var = segment.split(self.MARKERS[0], 1)[1].rsplit(self.MARKERS[1], 1)[0]
+        pos = var.find(":")
+        if ~pos:
+            return CONVERTERS.get(var[pos+1:])
+        return None
+
+    def _segment_regex(self, segment, group_prefix=''):
+        """Build the regex matching a single segment of the pattern"""
+        if not self._is_dynamic(segment):
+            return re.escape(segment)
+        prefix, rest = segment.split(self.MARKERS[0], 1)
+        var, suffix = rest.rsplit(self.MARKERS[1], 1)
+        pos = var.find(":")
+        # make them regexp safe
+        prefix = re.escape(prefix)
+        suffix = re.escape(suffix)
+        if ~pos:
+            regex = var[pos+1:]
+            converter = CONVERTERS.get(regex)
+            if converter is not None:
+                regex = converter.regex
+            return '%s(?P<%s%s>%s)%s' % (prefix, group_prefix, var[:pos],
+                                         regex, suffix)
+        else:
+            return r'%s(?P<%s%s>[^/]+)%s' % (prefix, group_prefix, var,
+                                             suffix)
+
+    def _segment_var(self, segment):
+        """Return the name of the variable of a segment, or None"""
+        if not self._is_dynamic(segment):
+            return None
+        var = segment.split(self.MARKERS[0], 1)[1].rsplit(self.MARKERS[1], 1)[0]
+        return var.split(':', 1)[0]
 
-        segments = self.pattern.split('/')
+    def _build_regex(self, segments=None, group_prefix=''):
+        """
+        Build the regex from the pattern (or from some of its segments),
+        prefixing the names of the groups with group_prefix.
+        """
+        if segments is None:
+            segments = self.pattern.split(self.SPLITTER)
+        return '/'.join(self._segment_regex(segment, group_prefix)
+                        for segment in segments)
+
+    def _prepare(self):
+        """Find the number of segments and the converters of the pattern"""
+        segments = self.pattern.split(self.SPLITTER)
         self._count = len(segments)
-        return '/'.join(re_segments(segments))
+        # (key, convert) of the typed vars.
+        self._converters = []
+        # (literal, None, None) or (None, key, parse) of each segment, when
+        # the template can be matched without its regex.
+        self._parsers = parsers = []
+        for i, segment in enumerate(segments):
+            converter = self._segment_converter(segment)
+            if parsers is not None:
+                parsers = self._segment_parser(segment, converter, parsers)
+            if converter is None:
+                continue
+            if converter.path:
+                if i != len(segments) - 1:
+                    raise ValueError("%r: a path can only end a template"
+                                     % self.pattern)
+                # All the remaining segments.
+                self._count = None
+            if converter.convert is not None:
+                key = _str_name(self._segment_var(segment))
+                self._converters.append((key, converter.convert))
+        self._parsers = parsers
+
+    def _segment_parser(self, segment, converter, parsers):
+        """
+        Append the parser of a segment of the pattern to parsers, and return
+        them, or None when the segment needs the regex.
+        """
+        if converter is None:
+            if self._is_dynamic(segment):
+                return None
+            if isinstance(segment, str):
+                # Undecoded bytes cannot be compared to the unicode segments.
+                try:
+                    segment.decode('ascii')
+                except UnicodeError:
+                    return None
+            parsers.append((segment, None, None))
+            return parsers
+        if converter.parse is None or not segment.startswith('{') or \
+                not segment.endswith('}'):
+            return None
+        parsers.append((None, _str_name(self._segment_var(segment)),
+                        converter.parse))
+        return parsers
 
     def _build_url(self):
         """Generate an URL from the matcher"""
         segments = self.pattern.split(self.SPLITTER)
         def re_segments(segments):
             for segment in segments:
-                if len(segment) >= 2 and (segment.find(self.MARKERS[0]) +
-                                          segment.find(self.MARKERS[1]) != -2):
+                if self._is_dynamic(segment):
                     prefix, rest = segment.split(self.MARKERS[0], 1)
                     var, suffix = rest.rsplit(self.MARKERS[1], 1)
                     pos = var.find(":")
@@ -189,8 +562,18 @@ class TemplateChildMatcher(object):
         return re_segments(segments)
 
     def _compile(self):
-        """Compile the regexp to match segments"""
-        self._regex = re.compile('^' + self._build_regex() + '$')
+        """Compile the regexp to match segments, and return it"""
+        regex = re.compile('^' + self._build_regex() + '$')
+        # (key, group) of the kwargs when a group name is unicode, as a key
+        # cannot be.
+        self._names = None
+        for name in regex.groupindex:
+            if isinstance(name, unicode):
+                self._names = [(_str_name(name), name)
+                               for name in regex.groupindex]
+                break
+        self._regex = regex
+        return regex
     
     def _url_for(self, obj=None, **kwargs):
         """Compile the URL with the given arguments.
@@ -216,20 +599,79 @@ class TemplateChildMatcher(object):
                             raise KeyError(key, "url_for: key is missing")
                 else:
                     segments.append(segment)
-            return segments
         else:
-            return [segment % kwargs for segment in template_url]
+            segments = [segment % kwargs for segment in template_url]
+        if self._count is None:
+            # The slashes of a path are not quoted.
+            segments[-1:] = segments[-1].split(self.SPLITTER)
+        return segments
 
     def __call__(self, request, segments):
-        match_segments, remaining_segments = \
-                segments[:self._count], segments[self._count:]
-        # Note: no need to use the url module to join the path segments here
-        # because we want the unquoted and decoded segments.
-        match_path = '/'.join(match_segments)
-        match = self._regex.match(match_path)
+        count = self._count
+        if count is None:
+            count = len(segments)
+        if count == 1 and segments:
+            match_path = segments[0]
+        else:
+            # Note: no need to use the url module to join the path segments
+            # here because we want the unquoted and decoded segments.
+            match_path = '/'.join(segments[:count])
+        regex = self._regex
+        if regex is None:
+            regex = self._compile()
+        match = regex.match(match_path)
         if not match:
             return None
-        return [], match.groupdict(), remaining_segments
+        if self._names is None:
+            kwargs = match.groupdict()
+        else:
+            kwargs = dict((key, match.group(name))
+                          for key, name in self._names)
+        for key, convert in self._converters:
+            kwargs[key] = convert(kwargs[key])
+        return [], kwargs, segments[count:]
+
+
+def _parse_segments(parsers, segments, offset):
+    """
+    Match the (literal, None, None) or (None, key, parse) parsers of a
+    template against the segments from offset on, without its regex, and
+    return the converted kwargs or None.
+    """
+    kwargs = {}
+    for literal, key, parse in parsers:
+        segment = segments[offset]
+        offset += 1
+        if key is None:
+            if segment != literal:
+                return None
+        else:
+            value = parse(segment)
+            if value is None:
+                return None
+            kwargs[key] = value
+    return kwargs
+
+
+def _str_name(name):
+    """Encode a unicode group name to use it as a keyword argument"""
+    if isinstance(name, unicode):
+        return name.encode('utf-8')
+    return name
+
+
+def _str_keys(match):
+    """
+    Return the (args, kwargs, segments) match of a matcher with the unicode
+    keys of kwargs encoded.
+    """
+    args, kwargs, segments = match
+    for key in kwargs:
+        if isinstance(key, unicode):
+            kwargs = dict((_str_name(key), value)
+                          for key, value in kwargs.iteritems())
+            return args, kwargs, segments
+    return match
 
 
 class AnyChildMatcher(object):
@@ -285,6 +727,8 @@ class ResourceMethodWrapper(object):
 
     def __init__(self, func):
         self.func = func
+        # Created on first use, once the annotations are set.
+        self._negotiator = None
 
     def __call__(self, request):
         # Extract annotations.
@@ -294,12 +738,13 @@ class ResourceMethodWrapper(object):
         if request.method != method:
             return http.method_not_allowed([method])
         # Look for a dispatcher.
-        dispatcher = _best_dispatcher([(self.func, match)], request)
-        if dispatcher is not None:
-            return _dispatch(request, match, self.func)
+        if self._negotiator is None:
+            self._negotiator = _Negotiator([(self.func, match)])
+        negotiation = _negotiate(self._negotiator, request)
+        if negotiation.dispatcher is not None:
+            return _dispatch(request, negotiation, self.func)
         # No dispatcher.
-        return http.not_acceptable([('Content-Type', 'text/plain')], \
-                                   '406 Not Acceptable')
+        return http.not_acceptable()
 
 
 class ALL(MethodDecorator):
@@ -342,22 +787,87 @@ class TRACE(MethodDecorator):
     method = 'TRACE'
 
 
+def metadata(func):
+    """
+    Declare the method returning the (name, value) headers of the response to
+    a GET request, Content-Length, ETag or Last-Modified for instance,
+    without making its body.
+
+    The default HEAD handler responds with them, and the Content-Type of the
+    negotiation, instead of calling the GET handler and discarding the body.
+    The method may return None to fall back on the GET handler.
+    """
+    setattr(func, _RESTISH_HOOK, 'metadata')
+    return func
+
+
+def etag(func):
+    """
+    Declare the method returning the entity tag of the representation a GET
+    request negotiates, like '"v42"' or 'W/"v42"' for a weak one, or None.
+    A bare value is quoted as a strong entity tag.
+
+    It is called before the GET handler, which is not called when the
+    request's If-None-Match matches it: a 304 is sent instead. The ETag
+    header is added to the GET responses that do not set it.
+    """
+    setattr(func, _RESTISH_HOOK, 'etag')
+    return func
+
+
+def last_modified(func):
+    """
+    Declare the method returning when the representation a GET request
+    negotiates was last modified, as a datetime (naive ones being UTC) or as
+    seconds since the epoch, or None.
+
+    It is called before the GET handler, which is not called when the
+    request's If-Modified-Since is not older: a 304 is sent instead. The
+    Last-Modified header is added to the GET responses that do not set it.
+    """
+    setattr(func, _RESTISH_HOOK, 'last_modified')
+    return func
+
+
 def _normalise_mimetype(mimetype):
     """
     Expand any shortcut mimetype names into a full mimetype
     """
     if '/' in mimetype:
         return mimetype
-    # Try mimetypes module, by extension.
-    real = mimetypes.guess_type('filename.%s' % mimetype)[0]
+    real = _MIMETYPES.get(mimetype)
     if real is not None:
         return real
-    # Try extra extension mapping.
-    real = SHORT_CONTENT_TYPE_EXTRA.get(mimetype)
-    if real is not None:
-        return real
-    # Oh well.
-    return mimetype
+    real = SHORT_CONTENT_TYPES.get(mimetype)
+    if real is None:
+        # Try mimetypes module, by extension.
+        import mimetypes
+        real = mimetypes.guess_type('filename.%s' % mimetype)[0]
+    if real is None:
+        # Try extra extension mapping.
+        real = SHORT_CONTENT_TYPE_EXTRA.get(mimetype)
+    if real is None:
+        # Oh well.
+        real = mimetype
+    _MIMETYPES[mimetype] = real
+    return real
+
+
+class _LazyClassAttribute(object):
+    """
+    Attribute of a class computed by func(cls) on first use, when it replaces
+    itself with the value.
+    """
+
+    def __init__(self, cls, name, func):
+        self.cls = cls
+        self.name = name
+        self.func = func
+
+    def __get__(self, instance, owner):
+        value = self.func(self.cls)
+        setattr(self.cls, self.name, value)
+        return value
 
 
 class _metaResource(type):
@@ -368,6 +878,7 @@ class _metaResource(type):
         cls = type.__new__(cls, name, bases, clsattrs)
         _gather_request_dispatchers(cls, clsattrs)
         _gather_child_factories(cls, clsattrs)
+        _gather_hooks(cls, clsattrs)
         return cls
 
 
@@ -388,6 +899,26 @@ def _gather_request_dispatchers(cls, clsattrs):
         request_dispatchers.setdefault(method, []).extend(dispatchers)
     # Set the handlers on the class.
     cls.request_dispatchers = request_dispatchers
+    # Parse the media ranges of the handlers once and for all, on first use.
+    cls._negotiators = _LazyClassAttribute(cls, '_negotiators',
+                                           _build_negotiators)
+    cls._method_table = _LazyClassAttribute(cls, '_method_table',
+                                            _build_method_table)
+
+
+def _build_negotiators(cls):
+    """
+    Return the _Negotiator of each method of the request dispatchers.
+    """
+    return dict((method, _Negotiator(dispatchers))
+                for method, dispatchers in cls.request_dispatchers.iteritems())
+
+
+def _build_method_table(cls):
+    """
+    Return the _MethodTable of the request dispatchers.
+    """
+    return _MethodTable(cls)
 
 
 def _gather_child_factories(cls, clsattrs):
@@ -410,6 +941,7 @@ def _gather_child_factories(cls, clsattrs):
             child_cls = getattr(func, _RESTISH_CHILD_CLASS)
             # who's your daddy
             child_cls._parent = cls
+            _url_formatters.clear()
             matcher = getattr(func, annotation, None)
             if child_cls not in cls.child_matchers or matcher.canonical:
                 cls.child_matchers[child_cls] = matcher
@@ -422,6 +954,27 @@ def _gather_child_factories(cls, clsattrs):
     # Sort the child factories by score.
     cls.child_factories = sorted(cls.child_factories,
                                  key=lambda i: i[0].score, reverse=True)
+    # Index them for a quick lookup, on first use.
+    cls._child_index = _LazyClassAttribute(cls, '_child_index',
+                                           _build_child_index)
+
+
+def _build_child_index(cls):
+    """
+    Return the _ChildIndex of the child factories.
+    """
+    return _ChildIndex(cls.child_factories)
+
+
+def _gather_hooks(cls, clsattrs):
+    """
+    Gather the hook -annotated methods, like @metadata, in the class's _hooks
+    dict of hook name -> function, along with the hooks of the base classes.
+    """
+    hooks = dict(getattr(cls, '_hooks', {}))
+    for func in _find_annotated_funcs(clsattrs, _RESTISH_HOOK):
+        hooks[getattr(func, _RESTISH_HOOK)] = func
+    cls._hooks = hooks
 
 
 def _find_annotated_funcs(clsattrs, annotation):
@@ -434,6 +987,659 @@ def _find_annotated_funcs(clsattrs, annotation):
     return funcs
 
 
+class _IndexNode(object):
+    """
+    Node of the child index trie.
+    """
+
+    __slots__ = ('children', 'literal', 'tails', 'units', 'first')
+
+    def __init__(self):
+        # Literal segment -> next node.
+        self.children = {}
+        # Index of the fully literal matcher ending here, if any.
+        self.literal = None
+        # (index, count, regex, matcher, segments) of the matchers whose
+        # remaining segments start with a dynamic one, in score order.
+        self.tails = []
+        # The tails compiled for the lookup, see _ChildIndex._units.
+        self.units = None
+        # Lowest index reachable from this node.
+        self.first = None
+
+
+class _ChildIndex(object):
+    """
+    Index of the child factories of a resource class.
+
+    The template matchers are stored in a trie keyed on their leading literal
+    segments. Whatever follows the first dynamic segment of a template is kept
+    at that node as a fallback branch matched by regex. The other matchers
+    (any, custom callables, ...) are tried in place, so the winner is always
+    the one a linear scan of the score-sorted child factories would pick.
+
+    Unless combine is False, the fallback branches of a node that consume the
+    same number of segments are compiled, on first use, into one alternation
+    regex whose named groups tell which matcher won.
+    """
+
+    # Python's re refuses patterns with more groups than that.
+    MAX_GROUPS = 99
+
+    def __init__(self, child_factories, combine=True):
+        self.factories = child_factories
+        self.combine = combine
+        self.root = _IndexNode()
+        # Indexes of the matchers that cannot be put in the trie.
+        self.others = []
+        # Number of segments the trie can look at.
+        self.depth = 0
+        for index, (matcher, func) in enumerate(child_factories):
+            if not self._add(index, matcher):
+                self.others.append(index)
+
+    def _add(self, index, matcher):
+        if type(matcher) is not TemplateChildMatcher or matcher._count is None:
+            return False
+        segments = matcher.pattern.split(matcher.SPLITTER)
+        literals = []
+        for segment in segments:
+            if matcher._is_dynamic(segment):
+                break
+            if isinstance(segment, str):
+                # Undecoded bytes cannot be compared to the unicode segments.
+                try:
+                    segment.decode('ascii')
+                except UnicodeError:
+                    return False
+            literals.append(segment)
+        tail = segments[len(literals):]
+        if tail:
+            try:
+                regex = re.compile('^' + matcher._build_regex(tail) + '$')
+            except re.error:
+                return False
+        path = [self.root]
+        for segment in literals:
+            path.append(path[-1].children.setdefault(segment, _IndexNode()))
+        node = path[-1]
+        if tail:
+            node.tails.append((index, len(tail), regex, matcher, tail))
+        elif node.literal is None:
+            node.literal = index
+        for node in path:
+            if node.first is None:
+                node.first = index
+        self.depth = max(self.depth, len(segments))
+        return True
+
+    def _units(self, tails):
+        """
+        Compile the tails of a node into a list of (first index, count, regex,
+        tags) units sorted by index. tags maps the tag group of each
+        alternative to its (index, [(group, var)]), or is the (index,
+        [(group, var)]) of a single tail, whose groups are None when they are
+        the vars. The tails matched by the parsers of their typed vars have a
+        None regex and (index, parsers of the tail) tags.
+        """
+        units = []
+        chunks = {}
+        for index, count, regex, matcher, tail in tails:
+            if matcher._parsers is not None:
+                # Matched without a regex, as the segments holding a '/' or
+                # a newline are left to the plain scan.
+                units.append((index, count, None,
+                              (index, matcher._parsers[-count:])))
+                continue
+            if not self.combine:
+                units.append((index, count, regex,
+                              self._single(index, regex)))
+                continue
+            names = [matcher._segment_var(segment) for segment in tail]
+            names = [name for name in names if name is not None]
+            if regex.flags != re.compile('').flags or \
+                    set(regex.groupindex) != set(names) or \
+                    _UNCOMBINABLE.search(regex.pattern):
+                # Global flags, inner named groups and references to groups
+                # would break once mixed with other regexes.
+                units.append((index, count, regex,
+                              self._single(index, regex)))
+                continue
+            prefix = '_%d_' % index
+            alternative = ('_%d' % index,
+                           matcher._build_regex(tail, prefix),
+                           [(prefix + name, _str_name(name))
+                            for name in names],
+                           regex.groups + 1)
+            chunk = chunks.get(count)
+            if chunk is None or \
+                    chunk[2] + alternative[3] > self.MAX_GROUPS:
+                chunk = chunks[count] = [index, [], 0]
+                units.append((index, count, chunk))
+            chunk[1].append(alternative)
+            chunk[2] += alternative[3]
+        for i, unit in enumerate(units):
+            if len(unit) == 3:
+                units[i] = self._combine(*unit)
+        return units
+
+    def _single(self, index, regex):
+        """Return the tags of a single tail"""
+        for name in regex.groupindex:
+            if isinstance(name, unicode):
+                return index, [(name, _str_name(name))
+                               for name in regex.groupindex]
+        return index, None
+
+    def _combine(self, first, count, chunk):
+        """Build the alternation unit of a chunk of tails"""
+        alternatives = chunk[1]
+        regex = '|'.join('(?P<%s>%s)' % (tag, regex)
+                         for tag, regex, groups, size in alternatives)
+        tags = dict((tag, (int(tag[1:]), groups))
+                    for tag, regex, groups, size in alternatives)
+        return first, count, re.compile('^(?:' + regex + ')$'), tags
+
+    def _search(self, segments, start, stop):
+        """
+        Return the (index, kwargs, consumed count) of the best template
+        matcher for segments[start:stop], or None.
+        """
+        best = None
+        node = self.root
+        depth = 0
+        length = stop - start
+        while True:
+            units = node.units
+            if units is None:
+                units = node.units = self._units(node.tails)
+            for first, count, regex, tags in units:
+                if best is not None and first >= best[0]:
+                    break
+                if depth + count > length:
+                    continue
+                offset = start + depth
+                if regex is None:
+                    index, parsers = tags
+                    kwargs = _parse_segments(parsers, segments, offset)
+                    if kwargs is not None and \
+                            (best is None or index < best[0]):
+                        best = index, kwargs, depth + count
+                    continue
+                if count == 1:
+                    match = regex.match(segments[offset])
+                else:
+                    match = regex.match('/'.join(
+                        segments[offset:offset+count]))
+                if match is None:
+                    continue
+                if type(tags) is tuple:
+                    index, groups = tags
+                else:
+                    index, groups = tags[match.lastgroup]
+                if groups is None:
+                    kwargs = match.groupdict()
+                else:
+                    kwargs = dict((var, match.group(group))
+                                  for group, var in groups)
+                for key, convert in self.factories[index][0]._converters:
+                    kwargs[key] = convert(kwargs[key])
+                if best is None or index < best[0]:
+                    best = index, kwargs, depth + count
+            if node.literal is not None and \
+                    (best is None or node.literal < best[0]):
+                best = node.literal, {}, depth
+            if depth == length:
+                break
+            node = node.children.get(segments[start + depth])
+            if node is None or (best is not None and node.first >= best[0]):
+                break
+            depth += 1
+        return best
+
+    def find(self, request, segments):
+        """
+        Find the child factory for the segments.
+
+        Return a (func, (match_args, match_kwargs, remaining segments)) tuple
+        or None.
+        """
+        factories = self.factories
+        cursor = segments.__class__ is url.SegmentCursor
+        if cursor:
+            items, start, stop = segments.segments, segments.start, \
+                    segments.stop
+        else:
+            items, start, stop = segments, 0, len(segments)
+        # Without any segment, a one segment template is matched against an
+        # empty string, leave that to the plain scan.
+        if start == stop:
+            return _scan_child_factories(factories, request, segments)
+        # A segment holding a '/' (from %2F) or a newline could be matched by
+        # several segments of a template, same thing.
+        for segment in items[start:min(stop, start + self.depth)]:
+            if '/' in segment or '\n' in segment:
+                return _scan_child_factories(factories, request, segments)
+        best = self._search(items, start, stop)
+        if best is None:
+            limit = len(factories)
+        else:
+            limit = best[0]
+        listed = None
+        for index in self.others:
+            if index >= limit:
+                break
+            matcher, func = factories[index]
+            # The other matchers get a list, as they always did.
+            if listed is None:
+                listed = segments
+                if cursor:
+                    listed = list(segments)
+            match = matcher(request, listed)
+            if match is not None:
+                return func, _str_keys(match)
+        if best is None:
+            return None
+        index, kwargs, consumed = best
+        if cursor:
+            remaining = url.SegmentCursor(items, start + consumed, stop)
+        else:
+            remaining = segments[consumed:]
+        return factories[index][1], ([], kwargs, remaining)
+
+
+# Back references and conditionals count on the group numbers.
+_UNCOMBINABLE = re.compile(r'\\[0-9]|\(\?P=|\(\?\(')
+
+
+class _ChildHits(object):
+    """
+    Hits of the child factories of a resource class, see
+    Resource.adaptive_child_order.
+    """
+
+    def __init__(self):
+        # Child factory -> number of lookups it won.
+        self.hits = {}
+        self.lookups = 0
+        # Pair of matchers -> whether no segments can match both.
+        self.disjoint = {}
+
+
+def _count_child_hit(cls, func):
+    """
+    Count a lookup won by the child factory, reordering the child factories
+    every adaptive_child_order lookups.
+    """
+    # Each class counts its own hits, not the ones of its base class.
+    stats = cls.__dict__.get('_child_hits')
+    if stats is None:
+        stats = cls._child_hits = _ChildHits()
+    stats.hits[func] = stats.hits.get(func, 0) + 1
+    stats.lookups += 1
+    if not stats.lookups % cls.adaptive_child_order:
+        _reorder_child_factories(cls, stats)
+
+
+def _reorder_child_factories(cls, stats):
+    """
+    Move the child factories of a class winning the most lookups before the
+    ones of equal score, as long as they are disjoint. Two matchers which may
+    match the same segments are never swapped, so every path is still matched
+    by the same child factory.
+    """
+    from restish import lint
+    hits, disjoint = stats.hits, stats.disjoint
+    factories = list(cls.child_factories)
+    moved = False
+    for i in xrange(1, len(factories)):
+        j = i
+        while j:
+            before, after = factories[j-1], factories[j]
+            if before[0].score != after[0].score or \
+                    hits.get(after[1], 0) <= hits.get(before[1], 0):
+                break
+            pair = frozenset([before[0], after[0]])
+            if pair not in disjoint:
+                disjoint[pair] = lint.disjoint(before[0], after[0])
+            if not disjoint[pair]:
+                break
+            factories[j-1], factories[j] = after, before
+            moved = True
+            j -= 1
+    if moved:
+        cls.child_factories = factories
+        cls._child_index = _ChildIndex(factories)
+
+
+def _scan_child_factories(child_factories, request, segments):
+    """
+    Try the child factories one after the other until one matches.
+    """
+    if isinstance(segments, url.SegmentCursor):
+        segments = list(segments)
+    for matcher, func in child_factories:
+        match = matcher(request, segments)
+        if match is not None:
+            return func, _str_keys(match)
+    return None
+
+
+def _head_metadata(resource, request, metadata):
+    """
+    Return the response to a HEAD request made of the headers returned by the
+    metadata hook of the resource for the GET handler the request negotiates,
+    or None to fall back on the GET handler.
+    """
+    methods = resource._method_table
+    negotiator = methods.negotiators.get(request.method, methods.fallback)
+    if negotiator is None:
+        return None
+    negotiation = _negotiate(negotiator, request)
+    if negotiation.dispatcher is None:
+        return None
+    headers = metadata(resource, request)
+    if headers is None:
+        return None
+    return _dispatch_get(resource, request, negotiation,
+                         lambda r: http.SimpleResponse('200 OK', headers, None))
+
+
+def _dispatch_get(resource, request, negotiation, func):
+    """
+    Dispatch a GET request to func, unless the validators returned by the etag
+    and last_modified hooks of the resource tell the client's copy is still
+    fresh, when a 304 is sent instead.
+
+    The validators are added to the successful responses that do not set them.
+    """
+    hooks = resource._hooks
+    etag_hook = hooks.get('etag')
+    last_modified_hook = hooks.get('last_modified')
+    if etag_hook is None and last_modified_hook is None:
+        return _dispatch(request, negotiation, func)
+    validators = []
+    etag = None
+    if etag_hook is not None:
+        etag = etag_hook(resource, request)
+        if etag is not None:
+            if not etag.startswith('"') and not etag.startswith('W/"'):
+                etag = '"%s"' % etag
+            validators.append(('ETag', etag))
+    modified = None
+    if last_modified_hook is not None:
+        modified = last_modified_hook(resource, request)
+        if modified is not None:
+            modified = _timestamp(modified)
+            validators.append(('Last-Modified', _http_date(modified)))
+    if validators and http.is_not_modified(request.environ, etag, modified):
+        return http.not_modified(validators)
+    response = _dispatch(request, negotiation, func)
+    if isinstance(response, (http.Response, http.SimpleResponse)) and \
+            200 <= response.status_int < 300:
+        for name, value in validators:
+            if not response.headers.get(name):
+                response.headers[name] = value
+    return response
+
+
+def _timestamp(modified):
+    """
+    Return the whole seconds since the epoch of the datetime or number.
+    """
+    if isinstance(modified, (int, long, float)):
+        return int(modified)
+    import calendar
+    return calendar.timegm(modified.utctimetuple())
+
+
+def _http_date(timestamp):
+    """
+    Return the HTTP date of the seconds since the epoch.
+    """
+    from email import utils
+    return utils.formatdate(timestamp, usegmt=True)
+
+
+def _dispatch(request, negotiation, func):
+    response = func(request)
+    # Try to autocomplete the content-type header if not set
+    # explicitly.
+    if isinstance(response, (http.Response, http.SimpleResponse)) and \
+            not response.headers.get('content-type'):
+        content_type = negotiation.content_type(request)
+        if content_type is not None:
+            response.headers['content-type'] = content_type
+    return response
+
+
+# (negotiator, Content-Type key, Accept) -> _Negotiation
+_NEGOTIATIONS = cache.LRUCache(1000)
+
+
+def _negotiate(negotiator, request):
+    """
+    Find the best dispatcher of the negotiator for the request.
+
+    Return a _Negotiation, whose dispatcher is None when nothing matches.
+    """
+    # Straight from the environ, like request.headers does it.
+    environ = request.environ
+    content_type = environ.get('CONTENT_TYPE')
+    accept = environ.get('HTTP_ACCEPT')
+    key = negotiator, _content_type_key(negotiator, content_type), accept
+    negotiation = _NEGOTIATIONS.get(key)
+    if negotiation is None:
+        negotiation = negotiator.negotiate(content_type, accept)
+        _NEGOTIATIONS.set(key, negotiation)
+    return negotiation
+
+
+def _content_type_key(negotiator, content_type):
+    """
+    Return the Content-Type without the parameters the negotiator does not
+    look at, like the multipart boundaries and the charsets that would make
+    a new cache key for every upload.
+    """
+    if not content_type or ';' not in content_type or ',' in content_type:
+        return content_type
+    parts = content_type.split(';')
+    params = negotiator.content_type_params
+    # Keep the parameters mimeparse cannot parse, for it to fail the same.
+    return ';'.join([parts[0].strip()] +
+                    [part.strip() for part in parts[1:]
+                     if '=' not in part or
+                     part.split('=', 1)[0].strip() in params])
+
+
+class _Negotiation(object):
+    """
+    Outcome of the content negotiation for a pair of Content-Type and Accept
+    headers.
+    """
+
+    def __init__(self, negotiator, index):
+        self.negotiator = negotiator
+        self.index = index
+        if index is None:
+            self.dispatcher = None
+        else:
+            self.dispatcher = negotiator.dispatchers[index]
+        self._content_type = self
+
+    def content_type(self, request):
+        """
+        Return the content type to set on a response of the dispatcher that
+        does not say it, or None.
+        """
+        # Worked out once, the Accept header being part of the cache key.
+        if self._content_type is self:
+            self._content_type = self.negotiator.content_type(self.index,
+                                                              request)
+        return self._content_type
+
+
+class _MethodTable(object):
+    """
+    The negotiators of the request methods of a resource class, the ALL one
+    standing for the methods without their own, and the Allow header listing
+    the methods handled, OPTIONS included.
+    """
+
+    def __init__(self, cls):
+        self.negotiators = cls._negotiators
+        self.fallback = self.negotiators.get(ALL.method)
+        methods = set(cls.request_dispatchers)
+        methods.discard(ALL.method)
+        methods.add(OPTIONS.method)
+        self.allow = ', '.join(sorted(methods))
+        # The responses to the OPTIONS requests the class has no handler for,
+        # and to the other methods it does not allow.
+        self.options = http.FrozenResponse('200 OK', [('Allow', self.allow)])
+        self.not_allowed = http.method_not_allowed(self.allow)
+
+
+class _Negotiator(object):
+    """
+    Content negotiation between a list of (func, match) dispatchers.
+
+    The media ranges supported by the dispatchers are parsed once, when the
+    negotiator is created, the same way mimeparse does it for every call of
+    best_match().
+    """
+
+    def __init__(self, dispatchers):
+        self.dispatchers = dispatchers
+        # Ordered lists of (position, media range, parsed, dispatcher index).
+        self.content_types = _parse_supported(dispatchers, 'content_type')
+        self.accepts = _parse_supported(dispatchers, 'accept')
+        # Names of the parameters of the supported content types, the only
+        # ones of the Content-Type header the negotiation looks at.
+        self.content_type_params = frozenset(
+                key for position, mime_type, target, index in self.content_types
+                if target is not None for key, value in target[2])
+
+    def negotiate(self, content_type, accept):
+        """
+        Filter the dispatchers on the Content-Type and then the Accept
+        header, and return the _Negotiation of the first one left.
+        """
+        candidates = range(len(self.dispatchers))
+        if content_type:
+            candidates = self._filter(self.content_types, candidates,
+                                      'content_type', str(content_type))
+        if accept:
+            accept = accept.strip(', ') # Some clients send bad accept headers
+            candidates = self._filter(self.accepts, candidates, 'accept',
+                                      accept)
+        if candidates:
+            return _Negotiation(self, candidates[0])
+        return _Negotiation(self, None)
+
+    def content_type(self, index, request):
+        """
+        Return the content type implied by the Accept header of the request
+        for the dispatcher at index, or None when the best match is a
+        wildcard.
+        """
+        # If there's no accept from the client and there's only one
+        # possible type from the match then use that as the best match.
+        # Otherwise use mimeparse to work out what the best match was. If
+        # the best match if not a wildcard then we know what content-type
+        # should be.
+        accept = request.environ.get('HTTP_ACCEPT', '')
+        match = self.dispatchers[index][1]
+        if not accept and len(match['accept']) == 1:
+            best_match = match['accept'][0]
+        else:
+            supported = [s for s in self.accepts if s[3] == index]
+            best_match = _best_match(supported, accept)
+        if '*' in best_match:
+            return None
+        return best_match
+
+    def _filter(self, supported, candidates, name, header):
+        supported = [s for s in supported if s[3] in candidates]
+        # Find the best type.
+        best_match = _best_match(supported, header)
+        # Return the matching dispatchers
+        return [index for index in candidates
+                if best_match in self.dispatchers[index][1][name]]
+
+
+def _parse_supported(dispatchers, name):
+    """
+    Parse the media ranges listed under name in the matches of the
+    dispatchers.
+    """
+    supported = []
+    for index, (func, match) in enumerate(dispatchers):
+        for mime_type in match[name]:
+            supported.append((len(supported), mime_type,
+                              _parse_target(mime_type), index))
+    return supported
+
+
+def _parse_target(mime_type):
+    """
+    Parse a supported media range, or return None if mimeparse cannot.
+    """
+    try:
+        type, subtype, params = mimeparse.parse_media_range(mime_type)
+    except ValueError:
+        # Let best_match() raise the error when it is actually used.
+        return None
+    params = [(key, value) for key, value in params.iteritems() if key != 'q']
+    return type, subtype, params
+
+
+def _best_match(supported, header):
+    """
+    mimeparse.best_match() working on parsed supported media ranges.
+    """
+    # Skip the blank ranges, like mimeparse does.
+    ranges = [mimeparse.parse_media_range(r) for r in header.split(',')
+              if r.strip()]
+    if not ranges:
+        return ''
+    best = None
+    for position, mime_type, target, index in supported:
+        if target is None:
+            # Raise the error of mimeparse.
+            mimeparse.parse_media_range(mime_type)
+        key = _fitness_and_quality(target, ranges), position
+        if best is None or key > best[0]:
+            best = key, mime_type
+    # mimeparse picks the last of the best ranges, hence the position.
+    if best is None or not best[0][0][1]:
+        return ''
+    return best[1]
+
+
+def _fitness_and_quality(target, ranges):
+    """
+    Same as mimeparse.fitness_and_quality_parsed() for a parsed target.
+    """
+    best_fitness, best_fit_q = -1, 0
+    target_type, target_subtype, target_params = target
+    for type, subtype, params in ranges:
+        if (type == target_type or type == '*' or target_type == '*') and \
+                (subtype == target_subtype or subtype == '*' or
+                 target_subtype == '*'):
+            fitness = 0
+            for key, value in target_params:
+                if key in params and params[key] == value:
+                    fitness += 1
+            if type == target_type:
+                fitness += 100
+            if subtype == target_subtype:
+                fitness += 10
+            if fitness > best_fitness:
+                best_fitness = fitness
+                best_fit_q = params['q']
+    return best_fitness, float(best_fit_q)
+
+
 class Resource(object):
     """
     Base class for additional resource types.
@@ -447,23 +1653,32 @@ class Resource(object):
 
     _resources = {}
 
+    # Set to True when the children declared with child(matcher, klass) are a
+    # pure function of the path, i.e. they never look at the request or at
+    # the state of the instance. RestishApp may then cache the traversal.
+    traversal_cacheable = False
+
+    # Number of instances, one per distinct match arguments, kept and reused
+    # when the class is a child declared with child(matcher, klass). Only
+    # for resources holding no per-request state. 0 creates a new instance
+    # every time.
+    shared_instances = 0
+
+    # Number of child lookups between two reorderings of the child factories
+    # of equal score, the most hit first, see child_stats. Only the ones that
+    # cannot match the same segments are swapped, so the order never changes
+    # which child a path leads to. 0 keeps the order of the scores and does
+    # not count the hits.
+    adaptive_child_order = 0
+
     def __init__(self, *args, **kwargs):
         pass
     
     def resource_child(self, request, segments):
-        for matcher, func in self.child_factories:
-            match = matcher(request, segments)
-            if match is not None:
-                break
-        else:
+        found = self._find_child(request, segments)
+        if found is None:
             return None
-        match_args, match_kwargs, segments = match
-        # A key cannot be in unicode. 
-        for key in match_kwargs.keys():
-            if isinstance(key, unicode):
-                value = match_kwargs[key]
-                del match_kwargs[key]
-                match_kwargs[key.encode("utf-8")] = value
+        func, match_args, match_kwargs, segments = found
         result = func(self, request, segments, *match_args, **match_kwargs)
         
         if result is None:
@@ -474,25 +1689,48 @@ class Resource(object):
             return result, segments
 
 
+    @classmethod
+    def _find_child(cls, request, segments):
+        """
+        Find the child factory for the segments.
+
+        Return a (func, match args, match kwargs, remaining segments) tuple or
+        None.
+        """
+        found = cls._child_index.find(request, segments)
+        if found is None:
+            return None
+        func, (match_args, match_kwargs, segments) = found
+        if cls.adaptive_child_order:
+            _count_child_hit(cls, func)
+        # Only the children declared with child(matcher, klass) know about
+        # cursors, the others get a list, as they always did.
+        if segments.__class__ is url.SegmentCursor and \
+                not hasattr(func, _RESTISH_CHILD_CLASS):
+            segments = list(segments)
+        return func, match_args, match_kwargs, segments
+
     def __call__(self, request):
-        # Get the dispatchers for the request method.
-        dispatchers = self.request_dispatchers.get(request.method)
-        # No normal dispatchers for method found,
-        if dispatchers is None:
-            # Looking for a magic dispatcher
-            dispatchers = self.request_dispatchers.get(ALL.method)
-            # No magic dispatchers found either,
-            # send 405 with list of allowed methods.
-            if dispatchers is None:
-                return http.method_not_allowed(', '.join(self.request_dispatchers))
+        # Get the negotiator of the dispatchers for the request method, or
+        # else of the magic dispatchers.
+        methods = self._method_table
+        negotiator = methods.negotiators.get(request.method, methods.fallback)
+        if negotiator is None:
+            # Answer OPTIONS with the list of allowed methods, send 405 with
+            # it otherwise.
+            if request.method == OPTIONS.method:
+                return methods.options
+            return methods.not_allowed
         # Look up the best dispatcher
-        dispatcher = _best_dispatcher(dispatchers, request)
-        if dispatcher is not None:
-            (callable, match) = dispatcher
-            return _dispatch(request, match, lambda r: callable(self, r))
+        negotiation = _negotiate(negotiator, request)
+        if negotiation.dispatcher is not None:
+            (callable, match) = negotiation.dispatcher
+            if request.method == GET.method and self._hooks:
+                return _dispatch_get(self, request, negotiation,
+                                     lambda r: callable(self, r))
+            return _dispatch(request, negotiation, lambda r: callable(self, r))
         # No match, send 406
-        return http.not_acceptable([('Content-Type', 'text/plain')], \
-                                   '406 Not Acceptable')
+        return http.not_acceptable()
 
     @HEAD()
     def head(self, request):
@@ -504,14 +1742,31 @@ class Resource(object):
         content. However, it is not suitable for static content where the size
         is already known, e.g. large blobs stored in a database.
 
-        In that scenario add a HEAD-decorated method to the application
+        In that scenario declare a @metadata method returning the headers,
+        Content-Length included, of the GET response: it is called instead of
+        the GET handler. Or add a HEAD-decorated method to the application
         resource's class that includes a Content-Length header but no body.
+
+        The app_iter of a GET response is closed, as it is never iterated.
         """
         request.method = 'GET'
+        metadata = self._hooks.get('metadata')
+        if metadata is not None:
+            response = _head_metadata(self, request, metadata)
+            if response is not None:
+                return response
         # Loop until we get an actual response to support resource forwarding.
         response = self(request)
-        while not isinstance(response, http.Response):
+        while not isinstance(response, http.BaseResponse):
             response = response(request)
+        # The body will never be iterated.
+        close = getattr(response.app_iter, 'close', None)
+        if close is not None:
+            close()
+        if isinstance(response, http.FrozenResponse):
+            # Immutable, keep its headers.
+            return http.FrozenResponse(response.status, response.headerlist,
+                                       None)
         content_length = response.headers.get('content-length')
         response.body = ''
         if content_length is not None:
@@ -523,81 +1778,32 @@ class Resource(object):
         """
         URL of this resource built using the given arguments
         """
-        parents = []
-                
-        while hasattr(cls, '_parent'):
-            segments = cls._parent.child_matchers.get(cls, None)._url_for(*args, **kwargs)
-            segments.reverse()
-            parents += segments
-            cls = cls._parent
-        if len(parents):
-            parents.reverse()
-        else:
-            parents = ['']
-        
-        return url.URL('/').child(*parents)
+        return _url_formatter(cls)(*args, **kwargs)
 
 
-def _dispatch(request, match, func):
-    response = func(request)
-    # Try to autocomplete the content-type header if not set
-    # explicitly.
-    # If there's no accept from the client and there's only one
-    # possible type from the match then use that as the best match.
-    # Otherwise use mimeparse to work out what the best match was. If
-    # the best match if not a wildcard then we know what content-type
-    # should be.
-    if isinstance(response, http.Response) and \
-            not response.headers.get('content-type'):
-        accept = str(request.accept)
-        if not accept and len(match['accept']) == 1:
-            best_match = match['accept'][0]
-        else:
-            best_match = mimeparse.best_match(match['accept'], accept)
-        if '*' not in best_match:
-            response.headers['content-type'] = best_match
-    
-    return response
-
-
-def _best_dispatcher(dispatchers, request):
+def _traversal_cacheable(resource):
     """
-    Find the best dispatcher for the request.
+    Tell whether the children of the resource can be cached by path.
     """
-    # Use content negotation to filter the dispatchers to an ordered list of
-    # only those that match.
-    content_type = request.headers.get('content-type')
-    if content_type:
-        dispatchers = _filter_dispatchers_on_content_type(dispatchers,
-                                                          str(content_type))
-    accept = request.headers.get('accept')
-    if accept:
-        accept = accept.strip(', ') # Some clients send bad accept headers
-        dispatchers = _filter_dispatchers_on_accept(dispatchers, accept)
-    # Return the best match or None
-    if dispatchers:
-        return dispatchers[0]
-    else:
-        return None
+    return isinstance(resource, Resource) and \
+            resource.traversal_cacheable and \
+            _declarative(resource.__class__)
 
 
-def _filter_dispatchers_on_content_type(dispatchers, content_type):
-    # Build an ordered list of the supported types.
-    supported = []
-    for d in dispatchers:
-        supported.extend(d[1]['content_type'])
-    # Find the best type.
-    best_match = mimeparse.best_match(supported, content_type)
-    # Return the matching dispatchers
-    return [d for d in dispatchers if best_match in d[1]['content_type']]
+def _declarative(cls):
+    """
+    Tell whether the children of the class are only found by its child
+    factories, i.e. resource_child is not overridden.
+    """
+    return isinstance(cls, _metaResource) and \
+            cls.resource_child.im_func is Resource.resource_child.im_func
 
 
-def _filter_dispatchers_on_accept(dispatchers, accept):
-    # Build an ordered list of the supported types.
-    supported = []
-    for d in dispatchers:
-        supported.extend(d[1]['accept'])
-    # Find the best accept type
-    best_match = mimeparse.best_match(supported, accept)
-    # Return the matching dispatchers
-    return [d for d in dispatchers if best_match in d[1]['accept']]
+def _declared_child_class(func):
+    """
+    Return the class created by a child(matcher, klass) factory, or None when
+    the factory is anything else or needs its parent.
+    """
+    if getattr(func, _RESTISH_CHILD_WITH_PARENT, True):
+        return None
+    return getattr(func, _RESTISH_CHILD_CLASS, None)
@@ -0,0 +1,121 @@
+"""
+Compilation of declarative resource trees into route tables.
+"""
+
+from restish import resource
+
+
+class Route(object):
+    """
+    A path template of a resource tree and the classes it goes through.
+
+    dynamic is True when the last class overrides resource_child, i.e. its
+    own children can only be found by traversing an instance.
+    """
+
+    def __init__(self, template, classes, dynamic=False):
+        self.template = template
+        self.classes = classes
+        self.dynamic = dynamic
+
+    def __repr__(self):
+        return '<Route "%s" %s>' % (self.template, self.classes[-1].__name__)
+
+
+class RouteTable(object):
+    """
+    Flat routing table of the resource tree declared with
+    child(matcher, klass) below a root resource class.
+
+    The routes made only of literal segments are resolved when the table is
+    compiled, so looking them up is a single dict access. The other paths are
+    resolved class by class, using the child index of each class, without
+    creating any intermediate resource.
+    """
+
+    def __init__(self, root_class):
+        self.root_class = root_class
+        # Route for each full path template.
+        self.routes = []
+        # Tuple of literal segments -> (classes, match args, match kwargs).
+        self.static = {}
+        self._compile((root_class,), [])
+
+    def _compile(self, classes, templates):
+        cls = classes[-1]
+        if not resource._declarative(cls):
+            return
+        for matcher, func in cls.child_factories:
+            child_class = resource._declared_child_class(func)
+            if child_class is None or \
+                    not isinstance(matcher, resource.TemplateChildMatcher):
+                continue
+            chain = classes + (child_class,)
+            path = templates + [matcher.pattern]
+            route = Route('/'.join(path), chain,
+                          not resource._declarative(child_class))
+            self.routes.append(route)
+            self._add_static(route)
+            # Stop at recursive trees.
+            if child_class not in classes:
+                self._compile(chain, path)
+
+    def _add_static(self, route):
+        segments = route.template.split(resource.TemplateChildMatcher.SPLITTER)
+        for segment in segments:
+            if resource.TemplateChildMatcher.MARKERS[0] in segment or \
+                    resource.TemplateChildMatcher.MARKERS[1] in segment:
+                return
+            if isinstance(segment, str):
+                try:
+                    segment.decode('ascii')
+                except UnicodeError:
+                    return
+        # Matchers looking at the request cannot be resolved beforehand.
+        for cls in route.classes[:-1]:
+            if cls._child_index.others:
+                return
+        segments = tuple(segments)
+        if segments in self.static:
+            return
+        resolved = self.resolve(None, segments)
+        if resolved is not None and not resolved[3] and \
+                resolved[0] == route.classes:
+            self.static[segments] = resolved[:3]
+
+    def resolve(self, request, segments):
+        """
+        Resolve the segments starting from the root class.
+
+        Return None when there is no such resource, otherwise a (classes,
+        match args, match kwargs, remaining segments) tuple. The last class
+        of the chain has to be created with the match args and kwargs, unless
+        it is the root, and traversed with the remaining segments, if any.
+        """
+        resolved = self.static.get(tuple(segments))
+        if resolved is not None:
+            classes, args, kwargs = resolved
+            return classes, args, dict(kwargs), ()
+        cls = self.root_class
+        classes = [cls]
+        args, kwargs = (), {}
+        while segments and resource._declarative(cls):
+            found = cls._find_child(request, segments)
+            if found is None:
+                return None
+            func, child_args, child_kwargs, remaining = found
+            child_class = resource._declared_child_class(func)
+            if child_class is None:
+                # Leave it to the resource.
+                break
+            cls, args, kwargs, segments = \
+                    child_class, child_args, child_kwargs, remaining
+            classes.append(cls)
+        return tuple(classes), args, kwargs, segments
+
+
+def compile_routes(root_class):
+    """
+    Compile the resource tree below the root class into a RouteTable.
+    """
+    return RouteTable(root_class)
@@ -170,7 +170,7 @@ def page(template, type='text/html', encoding='utf-8'):
             result = func(page, request, *a, **k)
             # The returned value can be either an http.Response,
             # an (headers, args) tuple or just an args dict.
-            if not isinstance(result, http.Response):
+            if not isinstance(result, http.BaseResponse):
                 if result is None:
                     raise Exception("Please return a dict or an http.Response "
                                     "(from %s)." % func.__name__)
@@ -205,7 +205,7 @@ def element(template):
     def decorator(func):
         def decorated(element, request, *a, **k):
             args = func(element, request, *a, **k)
-            if not isinstance(args, http.Response):
+            if not isinstance(args, http.BaseResponse):
                 return render_element(request, element, template, args)
             else:
                 return args
@@ -1,3 +1,4 @@
+import itertools
 import urlparse
 import urllib
 
@@ -37,14 +38,132 @@ def _unquote(S):
     return urllib.unquote_plus(S)
 
 
+# Bounded memos of the segments that needed unquoting and of the quoted
+# segments, cleared when full.
+_MAX_SEGMENTS = 1000
+_unquoted_segments = {}
+_quoted_segments = {}
+
+
+def _unquote_segment(segment):
+    """ Unquote and decode a str segment """
+    if '%' not in segment:
+        return _decode(segment)
+    try:
+        return _unquoted_segments[segment]
+    except KeyError:
+        if len(_unquoted_segments) >= _MAX_SEGMENTS:
+            _unquoted_segments.clear()
+        unquoted = _unquoted_segments[segment] = \
+                _decode(urllib.unquote(segment))
+        return unquoted
+
+
+def _quote_segment(segment):
+    """ Encode and quote a segment """
+    segment = _encode(segment)
+    try:
+        return _quoted_segments[segment]
+    except KeyError:
+        if len(_quoted_segments) >= _MAX_SEGMENTS:
+            _quoted_segments.clear()
+        quoted = _quoted_segments[segment] = _quote(segment, SAFE_SEGMENT)
+        return quoted
+
+
 def split_path(path):
     """
     Split a path of type str into a sequence of unicode segments.
     """
-    segments = [urllib.unquote(segment) for segment in path.split('/')]
-    if segments[:1] == ['']:
+    if not isinstance(path, str):
+        segments = [_decode(urllib.unquote(S)) for S in path.split('/')]
+    elif '%' not in path:
+        # Nothing to unquote, decode the whole path at once.
+        segments = _decode(path).split(u'/')
+    else:
+        segments = [_unquote_segment(S) for S in path.split('/')]
+    if segments[:1] == [u'']:
         segments = segments[1:]
-    return [_decode(S) for S in segments]
+    return segments
+
+
+class SegmentCursor(object):
+    """
+    Read-only view of a sequence of path segments from an offset, used to
+    walk down the resource tree without copying the remaining segments at
+    each level.
+
+    A cursor behaves like the list of the segments it covers: len(),
+    indexing, iteration, comparison and concatenation with lists all work.
+    Slicing it gives another cursor over the same segments.
+    """
+
+    __slots__ = ('segments', 'start', 'stop')
+
+    def __init__(self, segments, start=0, stop=None):
+        if stop is None:
+            stop = len(segments)
+        self.segments = segments
+        self.start = start
+        self.stop = stop
+
+    def __len__(self):
+        return self.stop - self.start
+
+    def __getitem__(self, index):
+        length = self.stop - self.start
+        if isinstance(index, slice):
+            start, stop, step = index.indices(length)
+            if step != 1:
+                return list(self)[index]
+            return SegmentCursor(self.segments, self.start + start,
+                                 self.start + max(start, stop))
+        if index < 0:
+            index += length
+        if not 0 <= index < length:
+            raise IndexError('segment index out of range')
+        return self.segments[self.start + index]
+
+    def __iter__(self):
+        return itertools.islice(self.segments, self.start, self.stop)
+
+    def __contains__(self, segment):
+        for item in self:
+            if item == segment:
+                return True
+        return False
+
+    def __eq__(self, other):
+        if isinstance(other, SegmentCursor):
+            other = list(other)
+        elif not isinstance(other, list):
+            return NotImplemented
+        return list(self) == other
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        if equal is NotImplemented:
+            return equal
+        return not equal
+
+    __hash__ = None
+
+    def __add__(self, other):
+        if isinstance(other, SegmentCursor):
+            other = list(other)
+        return list(self) + other
+
+    def __radd__(self, other):
+        return other + list(self)
+
+    def __repr__(self):
+        return repr(list(self))
+
+    def index(self, segment):
+        return list(self).index(segment)
+
+    def count(self, segment):
+        return list(self).count(segment)
 
 
 def join_path(path_segments):
@@ -53,8 +172,7 @@ def join_path(path_segments):
     """
     if not path_segments:
         return ''
-    return '/' + '/'.join([_quote((_encode(seg)), SAFE_SEGMENT)
-        for seg in path_segments])
+    return '/' + '/'.join([_quote_segment(seg) for seg in path_segments])
 
 
 def _split_query(query):
@@ -145,16 +263,26 @@ class URL(str):
                                        query,
                                        parts.fragment])
         
-        self = str.__new__(cls, url)
-        self.parsed_url = urlparse.urlsplit(url)
-        return self
+        return str.__new__(cls, url)
+
+    @property
+    def parsed_url(self):
+        """ The url split by urlparse.urlsplit, on first use """
+        try:
+            return self._parsed_url
+        except AttributeError:
+            self._parsed_url = parsed = urlparse.urlsplit(self)
+            return parsed
     
     def __eq__(self, other):
+        if not isinstance(other, str):
+            return False
+        # The same string is always split the same way.
+        if str.__eq__(self, other):
+            return True
         if isinstance(other, URL):
             return self.parsed_url == other.parsed_url
-        elif isinstance(other, str):
-            return self.parsed_url == urlparse.urlsplit(other)
-        return False
+        return self.parsed_url == urlparse.urlsplit(other)
     
     @property
     def scheme(self):
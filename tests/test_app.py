@@ -1,5 +1,8 @@
 # -*- coding: utf-8 -*-
 
+import os
+import subprocess
+import sys
 import unittest
 import webtest
 
@@ -29,6 +32,39 @@ class TestApp(unittest.TestCase):
         R = webtest.TestApp(A).get('/', status=200)
         assert R.body == 'root'
 
+    def test_import(self):
+        # The modules only needed by some applications are imported on first
+        # use.
+        code = ('import sys, restish.app; '
+                'print [m for m in sys.argv[1:] if m in sys.modules]')
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+        output = subprocess.check_output(
+                [sys.executable, '-c', code, 'uuid', 'mimetypes', 'json',
+                 'optparse'], env=env)
+        assert output.strip() == '[]'
+
+    def test_lazy_request(self):
+        requests = []
+        class Health(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                requests.append(request)
+                return http.ok([('Content-Type', 'text/plain')], 'ok')
+        class Root(resource.Resource):
+            health = resource.child('health', Health)
+            @resource.GET()
+            def get(self, request):
+                requests.append(request)
+                return http.ok([('Content-Type', 'text/plain')],
+                               request.GET['q'])
+        A = webtest.TestApp(app.RestishApp(Root(), lazy_request=True))
+        assert A.get('/health').body == 'ok'
+        assert A.head('/health').headers['Content-Length'] == '2'
+        assert A.get('/?q=x').body == 'x'
+        assert [r.__class__ for r in requests] == [http.LazyRequest] * 3
+        # Only the last one needed more than the method and the path.
+        assert [r._request is None for r in requests] == [True, True, False]
+
     def test_not_found(self):
         A = app.RestishApp(resource.Resource())
         R = webtest.TestApp(A).get('/not_found', status=404)
@@ -179,6 +215,114 @@ class TestApp(unittest.TestCase):
         assert testapp.get('/?foo=£').body == u"£ is a unicode"
 
 
+class TestTraversalCache(unittest.TestCase):
+
+    def make_app(self, **kwargs):
+        class Entry(resource.Resource):
+            def __init__(self, id):
+                self.id = id
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               'entry %s' % self.id)
+        class Dynamic(resource.Resource):
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'dynamic')
+        class Blog(resource.Resource):
+            traversal_cacheable = True
+            def __init__(self, blog):
+                self.blog = blog
+            entry = resource.child('{id}', Entry)
+            @resource.child()
+            def dynamic(self, request, segments):
+                return Dynamic()
+        class Other(resource.Resource):
+            entry = resource.child('{id}', Entry)
+        class Root(resource.Resource):
+            traversal_cacheable = True
+            blog = resource.child('blogs/{blog}', Blog)
+            other = resource.child('other', Other)
+        kwargs.setdefault('traversal_cache_size', 2)
+        return app.RestishApp(Root(), **kwargs)
+
+    def test_cache(self):
+        A = self.make_app()
+        for i in range(2):
+            R = webtest.TestApp(A).get('/blogs/foo/1', status=200)
+            assert R.body == 'entry 1'
+        assert A.traversal_cache.stats()['hits'] == 1
+        assert A.traversal_cache.stats()['misses'] == 1
+        classes, args, kwargs = A.traversal_cache.get('/blogs/foo/1')
+        assert [cls.__name__ for cls in classes] == ['Root', 'Blog', 'Entry']
+        assert kwargs == {'id': u'1'}
+
+    def test_intermediate(self):
+        A = self.make_app()
+        webtest.TestApp(A).get('/blogs/foo', status=405)
+        assert '/blogs/foo' in A.traversal_cache
+
+    def test_not_cached(self):
+        A = self.make_app()
+        # Imperative child.
+        R = webtest.TestApp(A).get('/blogs/foo/dynamic', status=200)
+        assert R.body == 'dynamic'
+        # Child of a resource that is not cacheable.
+        R = webtest.TestApp(A).get('/other/1', status=200)
+        assert R.body == 'entry 1'
+        # 404
+        R = webtest.TestApp(A).get('/nope', status=404)
+        assert len(A.traversal_cache) == 0
+
+    def test_eviction(self):
+        A = self.make_app()
+        for path in ['/blogs/foo/1', '/blogs/foo/2', '/blogs/foo/3']:
+            webtest.TestApp(A).get(path, status=200)
+        assert len(A.traversal_cache) == 2
+        assert A.traversal_cache.stats()['evictions'] == 1
+
+    def test_disabled(self):
+        A = app.RestishApp(resource.Resource(), traversal_cache_size=0)
+        assert A.traversal_cache is None
+        webtest.TestApp(A).get('/nope', status=404)
+
+    def test_not_found_cache(self):
+        now = [0]
+        A = self.make_app(not_found_cache_size=2, not_found_ttl=10)
+        A.not_found_cache.timer = lambda: now[0]
+        for i in range(2):
+            R = webtest.TestApp(A).get('/nope', status=404)
+            assert R.body == '404 Not Found'
+            webtest.TestApp(A).get('/blogs/foo/1/2', status=404)
+        assert '/nope' in A.not_found_cache
+        assert A.not_found_cache.stats()['hits'] == 1
+        # Only when no child factory matched in a cacheable subtree.
+        for path in ['/blogs/foo/1/2', '/blogs/foo/dynamic/2', '/other/1/2']:
+            webtest.TestApp(A).get(path, status=404)
+            assert path not in A.not_found_cache
+        now[0] += 10
+        assert '/nope' not in A.not_found_cache
+        webtest.TestApp(A).get('/nope', status=404)
+        assert A.not_found_cache.stats()['expirations'] == 1
+        assert '/nope' in A.not_found_cache
+
+    def test_not_found_cache_disabled(self):
+        A = self.make_app()
+        assert A.not_found_cache is None
+        webtest.TestApp(A).get('/nope', status=404)
+        A = self.make_app(traversal_cache_size=0, not_found_cache_size=10)
+        webtest.TestApp(A).get('/nope', status=404)
+        assert '/nope' in A.not_found_cache
+
+    def test_shared_instances(self):
+        A = self.make_app()
+        request = http.Request.blank('/blogs/foo/1')
+        entry = A.locate_resource(request)
+        assert A.locate_resource(request) is not entry
+        classes, args, kwargs = A.traversal_cache.get('/blogs/foo/1')
+        classes[-1].shared_instances = 1
+        entry = A.locate_resource(request)
+        assert A.locate_resource(request) is entry
+
+
 class CallableResource(object):
     def __call__(self, request):
         return http.ok([('Content-Type', 'text/plain')], 'CallableResource')
@@ -0,0 +1,81 @@
+import unittest
+
+from restish import cache
+
+
+class TestLRUCache(unittest.TestCase):
+
+    def test_get_set(self):
+        c = cache.LRUCache(10)
+        assert c.get('a') is None
+        assert c.get('a', 'default') == 'default'
+        c.set('a', 1)
+        assert c.get('a') == 1
+        assert 'a' in c
+        assert len(c) == 1
+        c.set('a', 2)
+        assert c.get('a') == 2
+        assert len(c) == 1
+
+    def test_eviction(self):
+        c = cache.LRUCache(2)
+        c.set('a', 1)
+        c.set('b', 2)
+        # Use 'a' so 'b' is the least recently used.
+        c.get('a')
+        c.set('c', 3)
+        assert 'a' in c
+        assert 'b' not in c
+        assert 'c' in c
+        assert c.evictions == 1
+
+    def test_stats(self):
+        c = cache.LRUCache(1)
+        c.get('a')
+        c.set('a', 1)
+        c.get('a')
+        c.set('b', 2)
+        assert c.stats() == {'hits': 1, 'misses': 1, 'evictions': 1,
+                             'expirations': 0, 'size': 1, 'maxsize': 1}
+
+    def test_pop_clear(self):
+        c = cache.LRUCache(10)
+        c.set('a', 1)
+        c.set('b', 2)
+        assert c.pop('a') == 1
+        assert c.pop('a') is None
+        assert len(c) == 1
+        c.clear()
+        assert len(c) == 0
+        c.set('c', 3)
+        assert c.get('c') == 3
+
+    def test_ttl(self):
+        now = [100.0]
+        c = cache.LRUCache(10, ttl=5, timer=lambda: now[0])
+        c.set('a', 1)
+        now[0] += 4
+        assert c.get('a') == 1
+        c.set('b', 2)
+        now[0] += 1
+        assert 'a' not in c
+        assert c.get('a') is None
+        assert c.get('b') == 2
+        # Setting again restarts the time to live.
+        c.set('b', 3)
+        now[0] += 4
+        assert c.get('b') == 3
+        now[0] += 1
+        assert c.get('b') is None
+        assert len(c) == 0
+        assert c.expirations == 2
+        assert c.misses == 2
+
+    def test_empty(self):
+        c = cache.LRUCache(0)
+        c.set('a', 1)
+        assert len(c) == 0
+
+
+if __name__ == '__main__':
+    unittest.main()
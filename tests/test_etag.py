@@ -0,0 +1,133 @@
+"""
+Test the ETag middleware.
+"""
+
+import hashlib
+import unittest
+import webtest
+
+from restish import app, etag, http, resource
+
+
+def md5(body):
+    return '"%s"' % hashlib.md5(body).hexdigest()
+
+
+class Body(object):
+    """
+    Iterable body, telling whether it was closed.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+        self.closed = False
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        self.closed = True
+
+
+class Resource(resource.Resource):
+
+    def __init__(self):
+        self.bodies = []
+
+    @resource.GET()
+    def get(self, request):
+        headers = [('Content-Type', 'text/plain'),
+                   ('Cache-Control', 'max-age=60')]
+        body = request.GET.get('body', u'body').encode('utf-8')
+        if request.GET.get('etag'):
+            headers.append(('ETag', '"own"'))
+        if request.GET.get('stream'):
+            body = Body([body[:2], body[2:]])
+            self.bodies.append(body)
+        return http.ok(headers, body)
+
+    @resource.POST()
+    def post(self, request):
+        return http.ok([('Content-Type', 'text/plain')], 'posted')
+
+
+def make_app(root, **kwargs):
+    return webtest.TestApp(etag.ETagMiddleware(app.RestishApp(root),
+                                               **kwargs))
+
+
+class TestETagMiddleware(unittest.TestCase):
+
+    def test_string(self):
+        testapp = make_app(Resource())
+        response = testapp.get('/')
+        assert response.body == 'body'
+        assert response.headers['ETag'] == md5('body')
+        for if_none_match in [md5('body'), 'W/' + md5('body'), '"x", ' +
+                              md5('body'), '*']:
+            response = testapp.get('/', headers={'If-None-Match':
+                                                 if_none_match}, status=304)
+            assert response.body == ''
+            assert response.headers['ETag'] == md5('body')
+            assert response.headers['Cache-Control'] == 'max-age=60'
+            assert 'Content-Type' not in response.headers
+        response = testapp.get('/', headers={'If-None-Match': '"x"'})
+        assert response.body == 'body'
+
+    def test_skipped(self):
+        testapp = make_app(Resource())
+        response = testapp.get('/?etag=1', headers={'If-None-Match':
+                                                    md5('body')})
+        assert response.headers['ETag'] == '"own"'
+        response = testapp.get('/nope', status=404)
+        assert 'ETag' not in response.headers
+        response = testapp.post('/')
+        assert 'ETag' not in response.headers
+
+    def test_stream(self):
+        root = Resource()
+        testapp = make_app(root)
+        # Streamed then memoised.
+        response = testapp.get('/?stream=1')
+        assert response.body == 'body'
+        assert 'ETag' not in response.headers
+        assert root.bodies[-1].closed
+        # Hashed before being sent.
+        response = testapp.get('/?stream=1')
+        assert response.body == 'body'
+        assert response.headers['ETag'] == md5('body')
+        assert root.bodies[-1].closed
+        response = testapp.get('/?stream=1', headers={'If-None-Match':
+                                                      md5('body')},
+                               status=304)
+        assert root.bodies[-1].closed
+        # Other representations are not memoised.
+        response = testapp.get('/?stream=1&body=other')
+        assert 'ETag' not in response.headers
+
+    def test_stream_buffer_size(self):
+        root = Resource()
+        testapp = make_app(root, buffer_size=4)
+        testapp.get('/?stream=1')
+        assert 'ETag' in testapp.get('/?stream=1').headers
+        # Too large, streamed and forgotten.
+        testapp.get('/?stream=1&body=large')
+        response = testapp.get('/?stream=1&body=large')
+        assert response.body == 'large'
+        assert 'ETag' not in response.headers
+        assert len(testapp.app.etags) == 1
+
+    def test_write(self):
+        def application(environ, start_response):
+            write = start_response('200 OK', [('Content-Type', 'text/plain')])
+            write('wri')
+            write('tten')
+            return []
+        testapp = webtest.TestApp(etag.ETagMiddleware(application))
+        response = testapp.get('/')
+        assert response.body == 'written'
+        assert 'ETag' not in response.headers
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,7 @@ import cgi
 import unittest
 import webtest
 
-from restish import app, http, url
+from restish import app, http, resource, url
 
 
 def make_environ(path='/bar', base_url='http://localhost:1234/foo', **k):
@@ -44,6 +44,58 @@ class TestRequestAttributes(unittest.TestCase):
         r = http.Request.blank('/', base_url='/foo/')
         self.assertEquals(r.application_path, '/foo/')
 
+    def test_url_cache(self):
+        request = http.Request.blank('/bar?a=b', base_url='/foo')
+        self.assertTrue(request.application_url is request.application_url)
+        self.assertTrue(request.url is request.url)
+        self.assertEquals(request.url, 'http://localhost/foo/bar?a=b')
+
+    def test_url_cache_invalidation(self):
+        request = http.Request.blank('/bar?a=b', base_url='/foo')
+        self.assertEquals(request.path_qs, '/foo/bar?a=b')
+        request.path_info_pop()
+        self.assertEquals(request.path_qs, '/foo/bar?a=b')
+        self.assertEquals(request.application_url, 'http://localhost/foo/bar')
+        request.environ['QUERY_STRING'] = 'c=d'
+        self.assertEquals(request.url, 'http://localhost/foo/bar?c=d')
+        request.environ['HTTP_HOST'] = 'example.com:8080'
+        self.assertEquals(request.host_url, 'http://example.com:8080')
+        self.assertEquals(request.path, '/foo/bar')
+
+
+class TestLazyRequest(unittest.TestCase):
+
+    def test_environ(self):
+        environ = make_environ('/bar', environ={'REQUEST_METHOD': 'PUT'})
+        request = http.LazyRequest(environ)
+        assert request.method == 'PUT'
+        assert request.script_name == '' and request.path_info == '/bar'
+        request.method = 'GET'
+        assert request.environ['REQUEST_METHOD'] == 'GET'
+        assert request._request is None
+
+    def test_request(self):
+        environ = make_environ('/bar?a=b', headers={'Accept': 'text/html'})
+        request = http.LazyRequest(environ)
+        assert request.headers['Accept'] == 'text/html'
+        assert isinstance(request.request, http.Request)
+        assert request.request is request.request
+        assert request.GET['a'] == 'b'
+        assert isinstance(request.url, url.URL)
+        request.thing = 1
+        assert request.request.thing == request.thing == 1
+        self.assertRaises(AttributeError, getattr, request, 'nothing')
+
+    def test_charset(self):
+        environ = make_environ('/bar?a=%E9')
+        request = http.LazyRequest(environ)
+        request.charset = 'latin-1'
+        assert request._request is None
+        assert request.charset == 'latin-1'
+        assert request.GET['a'] == u'\xe9'
+        request.charset = 'utf-8'
+        assert request.request.charset == 'utf-8'
+
 
 class TestResponseCreation(unittest.TestCase):
 
@@ -67,6 +119,114 @@ class TestResponseCreation(unittest.TestCase):
         assert r.headers == {'Content-Length': '0'}
 
 
+class TestFrozenResponse(unittest.TestCase):
+
+    def test_init(self):
+        r = http.FrozenResponse('200 OK', [('Content-Type', 'text/plain')],
+                                'bytes')
+        assert isinstance(r, http.BaseResponse)
+        assert r.status == '200 OK' and r.status_int == 200
+        assert r.headerlist == [('Content-Type', 'text/plain'),
+                                ('Content-Length', '5')]
+        assert r.headers['content-type'] == 'text/plain'
+        assert r.headers.get('ETag') is None
+        assert list(r.app_iter) == [r.body] == ['bytes']
+        # Without a body, the headers are kept as they are.
+        r = http.FrozenResponse('200 OK', [('Content-Length', '10')], None)
+        assert r.headerlist == [('Content-Length', '10')]
+        assert list(r.app_iter) == [] and r.body == ''
+        self.assertRaises(TypeError, http.FrozenResponse, '200 OK', [],
+                          u'unicode')
+
+    def test_immutable(self):
+        r = http.FrozenResponse('200 OK', [('Content-Type', 'text/plain')])
+        self.assertRaises(AttributeError, setattr, r, 'body', 'changed')
+        self.assertRaises(AttributeError, setattr, r, 'status', '404 Not Found')
+        def set_etag():
+            r.headers['ETag'] = '"1"'
+        self.assertRaises(TypeError, set_etag)
+        # The WSGI servers may change the headers they are given.
+        r.headerlist.append(('ETag', '"1"'))
+        assert 'ETag' not in r.headers
+        copy = r.copy()
+        assert isinstance(copy, http.Response)
+        copy.headers['ETag'] = '"1"'
+        assert copy.headers['Content-Type'] == 'text/plain'
+        assert copy.body == ''
+
+    def test_freeze(self):
+        r = http.freeze(http.ok([('Content-Type', 'text/plain')], 'Yay!'))
+        assert isinstance(r, http.FrozenResponse)
+        R = webtest.TestApp(app.RestishApp(lambda request: r)).get('/')
+        assert R.body == 'Yay!'
+        assert R.headers['Content-Length'] == '4'
+        R = webtest.TestApp(r).get('/')
+        assert R.body == 'Yay!'
+
+    def test_defaults(self):
+        # The factories called with their default arguments share their
+        # responses.
+        for factory in [http.bad_request, http.forbidden, http.not_found,
+                        http.not_acceptable, http.internal_server_error,
+                        http.not_modified]:
+            assert isinstance(factory(), http.FrozenResponse)
+            assert factory() is factory()
+        assert http.method_not_allowed('GET') is \
+                http.method_not_allowed(['GET'])
+        assert http.NotFoundError().make_response() is http.not_found()
+        assert isinstance(http.not_found([], ''), http.Response)
+
+
+class TestSimpleResponse(unittest.TestCase):
+
+    def test_init(self):
+        r = http.SimpleResponse('200 OK', [('Content-Type', 'text/plain')],
+                                'bytes')
+        assert isinstance(r, http.BaseResponse)
+        assert r.status == '200 OK' and r.status_int == 200
+        assert r.headerlist == [('Content-Type', 'text/plain'),
+                                ('Content-Length', '5')]
+        assert r.app_iter == ['bytes'] and r.body == 'bytes'
+        def gen():
+            yield 'a'
+            yield 'b'
+        r = http.SimpleResponse('200 OK', [], gen())
+        assert r.headerlist == []
+        assert r.body == 'ab' and r.app_iter == ['ab']
+        r = http.SimpleResponse('200 OK', [('Content-Length', '10')], None)
+        assert r.headerlist == [('Content-Length', '10')]
+        assert r.body == ''
+        self.assertRaises(TypeError, http.SimpleResponse, '200 OK', [],
+                          u'unicode')
+
+    def test_headers(self):
+        r = http.SimpleResponse('200 OK', [('Set-Cookie', 'a=1'),
+                                           ('set-cookie', 'b=2')])
+        assert r.headers['SET-COOKIE'] == 'b=2'
+        assert r.headers.getall('Set-Cookie') == ['a=1', 'b=2']
+        r.headers['Set-Cookie'] = 'c=3'
+        r.headers.add('X-Thing', '1')
+        assert r.headerlist == [('Content-Length', '0'), ('Set-Cookie', 'c=3'),
+                                ('X-Thing', '1')]
+        del r.headers['x-thing']
+        assert 'X-Thing' not in r.headers
+        r.body = 'changed'
+        assert r.headers['Content-Length'] == '7'
+        assert r.app_iter == ['changed']
+
+    def test_app(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.SimpleResponse('200 OK', [], '{}')
+        R = webtest.TestApp(app.RestishApp(Resource())).get('/')
+        assert R.headers['Content-Type'] == 'application/json'
+        assert R.body == '{}'
+        R = webtest.TestApp(app.RestishApp(Resource())).head('/')
+        assert R.headers['Content-Length'] == '2'
+        assert R.body == ''
+
+
 class TestSuccessResponseFactories(unittest.TestCase):
 
     def test_ok(self):
@@ -166,6 +326,33 @@ class TestRedirectionResponseFactories(unittest.TestCase):
         assert r.headers['Content-Length'] == '0'
         assert r.body == ''
 
+    def test_is_not_modified(self):
+        def environ(**headers):
+            return dict(('HTTP_' + name.upper(), value)
+                        for name, value in headers.iteritems())
+        assert not http.is_not_modified(environ(), '"a"', 100)
+        for if_none_match in ['"a"', 'W/"a"', '"b", "a"', '"b",W/"a"', '*']:
+            assert http.is_not_modified(environ(if_none_match=if_none_match),
+                                        '"a"')
+        assert http.is_not_modified(environ(if_none_match='"a"'), 'W/"a"')
+        assert not http.is_not_modified(environ(if_none_match='"b", "a,"'),
+                                        '"a"')
+        assert not http.is_not_modified(environ(if_none_match='"a"'))
+        since = 'Thu, 01 Jan 1970 00:01:40 GMT'
+        assert http.is_not_modified(environ(if_modified_since=since),
+                                    last_modified=100)
+        assert http.is_not_modified(environ(if_modified_since=since),
+                                    last_modified=99)
+        assert not http.is_not_modified(environ(if_modified_since=since),
+                                        last_modified=101)
+        assert not http.is_not_modified(environ(if_modified_since='never'),
+                                        last_modified=100)
+        assert not http.is_not_modified(environ(if_modified_since=since))
+        # If-None-Match wins.
+        assert not http.is_not_modified(
+                environ(if_none_match='"b"', if_modified_since=since),
+                '"a"', 100)
+
 
 class TestClientErrorResponseFactories(unittest.TestCase):
 
@@ -0,0 +1,165 @@
+# -*- coding: utf-8 -*-
+
+import StringIO
+import sys
+import unittest
+import warnings
+
+from restish import lint, resource
+
+
+class Leaf(resource.Resource):
+    pass
+
+
+class Blog(resource.Resource):
+    entry = resource.child('{id:[0-9]+}', Leaf)
+    tag = resource.child('{tag:[a-z]+}', Leaf)
+    leet = resource.child('{leet:13{2}7!}', Leaf)
+
+
+class Root(resource.Resource):
+    blog = resource.child('blogs/{blog}', Blog)
+    about = resource.child('about', Leaf)
+    @resource.child('about')
+    def about_us(self, request, segments):
+        pass
+
+
+class Clean(resource.Resource):
+    entry = resource.child('entries/{id:int}', Leaf)
+    feed = resource.child('feeds/{type:atom|rss}.xml', Leaf)
+
+
+class Invalid(resource.Resource):
+    x = resource.child('x/{x}', Leaf)
+    y = resource.child('y/{y:[}', Leaf)
+    # Valid, but not the second segment on its own.
+    z = resource.child('z/{z:[a-z]+}/{w:(?P=z)}', Leaf)
+
+
+def kinds(problems):
+    return sorted((problem.kind, problem.cls.__name__, problem.matcher.pattern)
+                  for problem in problems)
+
+
+class TestLint(unittest.TestCase):
+
+    def test_backtracking(self):
+        for regex in ['(a+)+', '(a*)*', '(a|aa)+', '([a-z]+[0-9]*)+',
+                      r'(\w+\s?)+', '(?:x|a+)+y']:
+            assert lint.backtracking(regex), regex
+        for regex in ['[^/]+', '.+', '(a+b)+', '(a|b)+', '(ab)*', '[0-9]+',
+                      'atom|rss|rss2', '[0-9]{4}']:
+            assert not lint.backtracking(regex), regex
+
+    def test_problems(self):
+        problems = lint.lint([Root])
+        # The order of the children of equal score is left to the dicts.
+        problem = [p for p in problems if p.cls is Root][0]
+        assert problem.kind == 'unreachable'
+        assert problem.matcher.pattern == problem.other.pattern == 'about'
+        problems = [p for p in problems if p.cls is Blog]
+        assert [p.kind for p in problems] == ['ambiguous']
+        assert set([problems[0].matcher.pattern, problems[0].other.pattern]) \
+                == set(['{id:[0-9]+}', '{leet:13{2}7!}'])
+        assert lint.lint([Clean]) == []
+
+    def test_unreachable(self):
+        class Resource(resource.Resource):
+            a = resource.child('{x}/b', Leaf)
+            b = resource.child('{y}/b', Leaf)
+            c = resource.child('a/{z}', Leaf)
+            @resource.child(resource.any)
+            def d(self, request, segments):
+                pass
+            @resource.child(resource.any)
+            def e(self, request, segments):
+                pass
+        problems = lint.lint_class(Resource)
+        assert sorted(p.kind for p in problems) == ['unreachable',
+                                                    'unreachable']
+        assert set(p.matcher.score for p in problems) == set([(0, 1), ()])
+
+    def test_disjoint(self):
+        class Resource(resource.Resource):
+            a = resource.child('{a:[0-9]+}', Leaf)
+            b = resource.child('{b:[a-z]+}', Leaf)
+            c = resource.child('_{c}', Leaf)
+            d = resource.child('a/{d}', Leaf)
+            e = resource.child('b/{e}', Leaf)
+        assert lint.lint_class(Resource) == []
+
+    def test_disjoint_alignment(self):
+        def disjoint(pattern, other):
+            return lint.disjoint(resource.TemplateChildMatcher(pattern),
+                                 resource.TemplateChildMatcher(other))
+        assert disjoint('{a}/x', '{b}/y')
+        assert disjoint('{a:int}/{b:[a-z]+}', '{c:int}/{d:[0-9]+}')
+        assert disjoint('{a:x}', '{b:X}')
+        # The segments after one matching a '/' may not line up.
+        assert not disjoint('{a:.+}/x', '{b:.+}/y')
+        assert not disjoint('{a:[^a]+}/x', '{b}/y')
+        # Neither when a flag applies to the whole template.
+        assert not disjoint('{a:(?i)x}', '{b:X}')
+        assert not disjoint('{a:(?i)[0-9]}/x', '{b}/X')
+        assert not disjoint('{a}', '{b:[0-9]*}')
+
+    def test_invalid(self):
+        class Resource(resource.Resource):
+            a = resource.child('{a:[}', Leaf)
+            b = resource.child('b', Leaf)
+        assert kinds(lint.lint_class(Resource)) == [
+                ('invalid', 'Resource', '{a:[}')]
+
+    def test_slow(self):
+        class Resource(resource.Resource):
+            a = resource.child('{a:(a+)+}', Leaf)
+            b = resource.child('x/{b:[0-9]+}', Leaf)
+        problems = lint.lint_class(Resource)
+        assert kinds(problems) == [('backtracking', 'Resource', '{a:(a+)+}')]
+        problems = lint.lint_class(Resource, max_cost=-1)
+        assert ('slow', 'Resource', 'x/{b:[0-9]+}') in kinds(problems)
+        assert lint.cost(resource.TemplateChildMatcher('{a:(a+)+}'), 12) > \
+                lint.cost(resource.TemplateChildMatcher('{a}'), 12)
+        assert lint.cost(resource.TemplateChildMatcher('a/b')) == 0
+
+    def test_check(self):
+        assert lint.check([Clean], strict=True) == []
+        self.assertRaises(lint.RouteError, lint.check, [Root], strict=True)
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter('always', lint.RouteWarning)
+            problems = lint.check([Root])
+        assert problems
+        assert [w.category for w in caught] == [lint.RouteWarning] * \
+                len(problems)
+
+    def test_main(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            assert lint.main(['tests.test_lint:Clean']) == 0
+            assert lint.main(['tests.test_lint:Root']) == 1
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        assert 'tests.test_lint.Root: <TemplateChildMatcher "about"> is ' \
+               'hidden by' in output
+
+    def test_main_verbose_invalid(self):
+        stdout = sys.stdout
+        sys.stdout = StringIO.StringIO()
+        try:
+            assert lint.main(['-v', 'tests.test_lint:Invalid']) == 1
+            output = sys.stdout.getvalue()
+        finally:
+            sys.stdout = stdout
+        assert 'tests.test_lint.Invalid: <TemplateChildMatcher "y/{y:[}"> ' \
+               'invalid' in output
+        assert 'tests.test_lint.Invalid: <TemplateChildMatcher "x/{x}"> ' \
+               in output
+        assert 'tests.test_lint.Invalid: <TemplateChildMatcher ' \
+               '"z/{z:[a-z]+}/{w:(?P=z)}"> ' in output
+        assert [problem for problem in kinds(lint.lint_class(Invalid))
+                if problem[0] != 'ambiguous'] == [
+                ('invalid', 'Invalid', 'y/{y:[}')]
@@ -4,7 +4,10 @@
 Test resource behaviour.
 """
 
+import datetime
+import mimetypes
 import unittest
+import mimeparse
 import webtest
 
 from restish import app, http, resource, templating, url
@@ -88,12 +91,72 @@ class TestResourceMetaclass(unittest.TestCase):
             pass
         assert len(Derived.request_dispatchers['GET']) == 1
 
+    def test_lazy_compilation(self):
+        # Nothing is compiled until the first dispatch.
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], '{}')
+            @resource.child('{id:[0-9]+}')
+            def entry(self, request, segments, id):
+                return http.ok([('Content-Type', 'text/plain')], id)
+            @resource.child('{a:[}')
+            def invalid(self, request, segments, a):
+                pass
+        for name in ['_negotiators', '_child_index']:
+            assert isinstance(Resource.__dict__[name],
+                              resource._LazyClassAttribute)
+        matchers = [matcher for matcher, func in Resource.child_factories]
+        assert [matcher._regex for matcher in matchers] == [None, None]
+        A = make_app(Resource())
+        assert A.get('/').body == '{}'
+        assert isinstance(Resource.__dict__['_negotiators'], dict)
+        # The invalid regex fails its first lookup.
+        self.assertRaises(Exception, A.get, '/x')
+        class Derived(Resource):
+            pass
+        assert isinstance(Derived.__dict__['_negotiators'],
+                          resource._LazyClassAttribute)
+        assert sorted(Derived._negotiators) == sorted(Resource._negotiators)
+        assert Derived._negotiators is not Resource._negotiators
+
 
 class TestResource(unittest.TestCase):
     
     def test_no_method_handler(self):
         make_app(resource.Resource()).get('/', status=405)
 
+    def test_allow(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'GET')
+            @resource.POST()
+            def post(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'POST')
+        app = make_app(Resource())
+        response = app.put('/', status=405)
+        assert response.headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+        response = app.options('/', status=200)
+        assert response.headers['Allow'] == 'GET, HEAD, OPTIONS, POST'
+        assert response.headers['Content-Length'] == '0'
+        assert response.body == ''
+        assert Resource._method_table is Resource._method_table
+
+    def test_options(self):
+        # The OPTIONS handlers, magic or not, take over.
+        class Resource(resource.Resource):
+            @resource.OPTIONS()
+            def options(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'OPTIONS')
+        assert make_app(Resource()).options('/').body == 'OPTIONS'
+        class Resource(resource.Resource):
+            @resource.ALL()
+            def all(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               request.method)
+        assert make_app(Resource()).options('/').body == 'OPTIONS'
+
     def test_methods(self):
         class Resource(resource.Resource):
             @resource.HEAD()
@@ -205,6 +268,146 @@ class TestResource(unittest.TestCase):
         assert head_response.headers['content-length'] == '4'
         assert head_response.body == ''
 
+    def test_metadata_head(self):
+        calls = []
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                calls.append('GET')
+                return http.ok([], '{}')
+            @resource.metadata
+            def metadata(self, request):
+                calls.append('metadata')
+                if request.GET.get('fallback'):
+                    return None
+                return [('Content-Length', '1024'), ('ETag', '"1"')]
+        class Derived(Resource):
+            pass
+        for cls in [Resource, Derived]:
+            del calls[:]
+            response = make_app(cls()).head('/')
+            assert calls == ['metadata']
+            assert response.headers['Content-Length'] == '1024'
+            assert response.headers['ETag'] == '"1"'
+            assert response.headers['Content-Type'] == 'application/json'
+            assert response.body == ''
+        del calls[:]
+        response = make_app(Resource()).head('/?fallback=1')
+        assert calls == ['metadata', 'GET']
+        assert response.headers['Content-Length'] == '2'
+        # The negotiation fails as it would for a GET.
+        make_app(Resource()).head('/', headers={'Accept': 'text/html'},
+                                  status=406)
+
+    def test_etag(self):
+        calls = []
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                calls.append('GET')
+                return http.ok([], '{}')
+            @resource.etag
+            def etag(self, request):
+                calls.append('etag')
+                return request.GET.get('etag', 'v1')
+        class Derived(Resource):
+            pass
+        for cls in [Resource, Derived]:
+            app = make_app(cls())
+            del calls[:]
+            response = app.get('/')
+            assert calls == ['etag', 'GET']
+            assert response.headers['ETag'] == '"v1"'
+            for if_none_match in ['"v1"', 'W/"v1"', '"v0", "v1"', '*',
+                                  '"v0",W/"v1"']:
+                del calls[:]
+                response = app.get('/', headers={'If-None-Match':
+                                                 if_none_match}, status=304)
+                assert calls == ['etag']
+                assert response.headers['ETag'] == '"v1"'
+                assert response.body == ''
+            del calls[:]
+            app.get('/', headers={'If-None-Match': '"v0", "v1,"'}, status=200)
+            assert calls == ['etag', 'GET']
+        # Weak entity tags are kept as they are, and compared weakly.
+        app = make_app(Resource())
+        response = app.get('/?etag=W/"v2"')
+        assert response.headers['ETag'] == 'W/"v2"'
+        app.get('/?etag=W/"v2"', headers={'If-None-Match': '"v2"'},
+                status=304)
+        # HEAD requests are conditional too.
+        response = app.head('/', headers={'If-None-Match': '"v1"'},
+                            status=304)
+        assert response.headers['ETag'] == '"v1"'
+        # Other methods are not.
+        class Resource(Resource):
+            @resource.POST()
+            def post(self, request):
+                return http.ok([('Content-Type', 'text/plain')], 'posted')
+        make_app(Resource()).post('/', headers={'If-None-Match': '"v1"'},
+                                  status=200)
+
+    def test_last_modified(self):
+        calls = []
+        class Resource(resource.Resource):
+            @resource.GET(accept='json')
+            def json(self, request):
+                calls.append('GET')
+                return http.ok([('ETag', '"own"')], '{}')
+            @resource.last_modified
+            def last_modified(self, request):
+                return datetime.datetime(2010, 6, 1, 12, 30, 15)
+            @resource.etag
+            def etag(self, request):
+                return None
+        app = make_app(Resource())
+        response = app.get('/')
+        assert response.headers['Last-Modified'] == \
+                'Tue, 01 Jun 2010 12:30:15 GMT'
+        assert response.headers['ETag'] == '"own"'
+        for since in ['Tue, 01 Jun 2010 12:30:15 GMT',
+                      'Wednesday, 02-Jun-10 12:30:15 GMT']:
+            del calls[:]
+            response = app.get('/', headers={'If-Modified-Since': since},
+                               status=304)
+            assert calls == []
+            assert response.headers['Last-Modified'] == \
+                    'Tue, 01 Jun 2010 12:30:15 GMT'
+        for since in ['Tue, 01 Jun 2010 12:30:14 GMT', 'yesterday']:
+            app.get('/', headers={'If-Modified-Since': since}, status=200)
+        # If-None-Match wins over If-Modified-Since.
+        app.get('/', headers={'If-Modified-Since':
+                              'Tue, 01 Jun 2010 12:30:15 GMT',
+                              'If-None-Match': '"own"'}, status=200)
+
+    def test_validators_errors(self):
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.not_found()
+            @resource.etag
+            def etag(self, request):
+                return '"v1"'
+        response = make_app(Resource()).get('/', status=404)
+        assert 'ETag' not in response.headers
+
+    def test_head_closes(self):
+        closed = []
+        class Body(object):
+            def __iter__(self):
+                raise AssertionError('iterated')
+            def close(self):
+                closed.append(True)
+        class Resource(resource.Resource):
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain'),
+                                ('Content-Length', '10')], Body())
+        response = make_app(Resource()).head('/')
+        assert closed == [True]
+        assert response.headers['Content-Length'] == '10'
+        assert response.body == ''
+
     def test_specialised_head(self):
         class Resource(resource.Resource):
             @resource.GET()
@@ -545,6 +748,87 @@ class TestChildLookup(unittest.TestCase):
             R = webtest.TestApp(A).get(path)
             assert R.body == expected
     
+    def test_typed_match(self):
+        class Resource(resource.Resource):
+            @resource.child('items/{id:int}')
+            def item(self, request, segments, **kw):
+                return http.ok([('Content-Type', 'text/plain')], repr(kw))
+
+            @resource.child('things/{key:uuid}')
+            def thing(self, request, segments, **kw):
+                return http.ok([('Content-Type', 'text/plain')], repr(kw))
+
+            @resource.child('tags/{tag:slug}')
+            def tag(self, request, segments, **kw):
+                return http.ok([('Content-Type', 'text/plain')], repr(kw))
+
+            @resource.child('files/{path:path}')
+            def files(self, request, segments, **kw):
+                return http.ok([('Content-Type', 'text/plain')],
+                               repr((kw, segments)))
+
+        tests = [
+                ('/items/42', "{'id': 42}"),
+                ('/things/12345678-1234-1234-1234-123456789ABC',
+                 "{'key': UUID('12345678-1234-1234-1234-123456789abc')}"),
+                ('/tags/a-b_c', "{'tag': u'a-b_c'}"),
+                ('/files/a/b%20c/d.txt', "({'path': u'a/b c/d.txt'}, [])"),
+                ]
+        A = make_app(Resource())
+        for path, expected in tests:
+            self.assertEquals(A.get(path).body, expected)
+        for path in ['/items/x', '/items/-1', '/things/1234', '/tags/a.b',
+                     '/files']:
+            A.get(path, status=404)
+        # The child index converts like the matchers.
+        for segments in [[u'items', u'7'], [u'files', u'a', u'b'],
+                         [u'tags', u'x'], [u'items', u'4\u0663'],
+                         [u'items', u'12\n'], [u'tags', u'a.b'],
+                         [u'things', u'12345678-1234-1234-1234-123456789abc'],
+                         [u'things', u'12345678-1234-1234-1234-12345678-abc']]:
+            expected = resource._scan_child_factories(
+                Resource.child_factories, None, segments)
+            found = Resource._child_index.find(None, segments)
+            self.assertEquals(found, expected)
+
+    def test_typed_parsers(self):
+        """
+        Check the child index parses the typed vars as the regexes match them,
+        for the segments it does not leave to the plain scan.
+        """
+        values = [u'42', u'007', u'', u'-1', u'4\u0663', u'\xb2',
+                  u'12345678-1234-1234-1234-123456789ABC',
+                  u'12345678-1234-1234-1234-123456789ABX',
+                  u'12345678-1234-1234-1234-12345678-ABC',
+                  u'123456781234-1234-1234-1234-56789ABC', u'a-b_c', u'a.b',
+                  u'\xe9t\xe9', u'items', u'edit']
+        for pattern in ['{id:int}', '{key:uuid}', '{tag:slug}',
+                        'items/{id:int}', '{id:int}/edit',
+                        'items/{id:int}/{tag:slug}']:
+            matcher = resource.TemplateChildMatcher(pattern)
+            count = matcher._count
+            for first in values:
+                for second in values[:4] + values[-4:]:
+                    for segments in [[first, second],
+                                     [u'items', first, second]]:
+                        if len(segments) < count:
+                            continue
+                        kwargs = resource._parse_segments(matcher._parsers,
+                                                          segments, 0)
+                        expected = matcher(None, segments)
+                        if kwargs is None:
+                            assert expected is None
+                        else:
+                            self.assertEquals(expected,
+                                              ([], kwargs, segments[count:]))
+        # The other templates keep their regex.
+        for pattern in ['{id}', '{id:[0-9]+}', 'v{id:int}', '{path:path}']:
+            assert resource.TemplateChildMatcher(pattern)._parsers is None
+
+    def test_typed_path_must_end(self):
+        self.assertRaises(ValueError, resource.TemplateChildMatcher,
+                          '{path:path}/edit')
+
     def test_subtree_match(self):
         class Resource(resource.Resource):
             @resource.child()
@@ -646,9 +930,164 @@ class TestChildLookup(unittest.TestCase):
         R = webtest.TestApp(A).get('/foo')
         assert R.body == 'foobar'
 
+    def test_index_matches_scan(self):
+        """
+        Check the child index picks the same winner as a linear scan.
+        """
+        class Custom(object):
+            score = (1,)
+            def __call__(self, request, segments):
+                if segments[:1] == ['custom']:
+                    return [], {}, segments[1:]
+        class Resource(resource.Resource):
+            @resource.child('a/b/c')
+            def _1(self, request, segments):
+                pass
+            @resource.child('a/b/{c}')
+            def _2(self, request, segments, c):
+                pass
+            @resource.child('a/{b}/c/{d}')
+            def _3(self, request, segments, b, d):
+                pass
+            @resource.child('a')
+            def _4(self, request, segments):
+                pass
+            @resource.child('{a:[0-9]+}')
+            def _5(self, request, segments, a):
+                pass
+            @resource.child('{a}/b')
+            def _6(self, request, segments, a):
+                pass
+            @resource.child(Custom())
+            def _7(self, request, segments):
+                pass
+            @resource.child('a{b}c')
+            def _8(self, request, segments, b):
+                pass
+            @resource.child('')
+            def _9(self, request, segments):
+                pass
+            @resource.child(u'\xe9/{e}')
+            def _10(self, request, segments, e):
+                pass
+            @resource.child(resource.any)
+            def _11(self, request, segments):
+                pass
+        paths = [[], [u''], [u'a'], [u'a', u'b'], [u'a', u'b', u'c'],
+                 [u'a', u'b', u'x'], [u'a', u'x', u'c', u'y'], [u'12'],
+                 [u'12', u'b'], [u'x', u'b', u'c'], [u'custom'], [u'abc'],
+                 [u'\xe9', u'x'], [u'a/b', u'c'], [u'a\n'], [u'nope']]
+        for segments in paths:
+            expected = resource._scan_child_factories(
+                Resource.child_factories, None, segments)
+            found = Resource._child_index.find(None, segments)
+            assert found == expected, (segments, found, expected)
+            index = resource._ChildIndex(Resource.child_factories,
+                                         combine=False)
+            found = index.find(None, segments)
+            assert found == expected, (segments, found, expected)
+
+    def test_index_many_templates(self):
+        """
+        Check the combined regexes of the child index respect the limit on
+        the number of groups.
+        """
+        def factory(n):
+            def func(self, request, segments, **kwargs):
+                return http.ok([('Content-Type', 'text/plain')],
+                               '%d %s' % (n, kwargs['id']))
+            return resource.child('x%d-{id:[0-9]+}' % n)(func)
+        attrs = dict(('child%d' % n, factory(n)) for n in range(150))
+        Resource = type('Resource', (resource.Resource,), attrs)
+        A = webtest.TestApp(app.RestishApp(Resource()))
+        for n in [0, 98, 99, 149]:
+            assert A.get('/x%d-42' % n).body == '%d 42' % n
+        A.get('/x150-42', status=404)
+
+    def test_adaptive_order(self):
+        from restish import lint
+        def factory(name):
+            def func(self, request, segments, **kwargs):
+                return http.ok([('Content-Type', 'text/plain')], name)
+            return func
+        class Resource(resource.Resource):
+            adaptive_child_order = 10
+            number = resource.child('{a:[0-9]+}')(factory('number'))
+            lower = resource.child('{a:[a-z]+}')(factory('lower'))
+            upper = resource.child('{a:[A-Z]+}')(factory('upper'))
+            under = resource.child('_{a}')(factory('under'))
+            alnum = resource.child('{a:[a-z0-9]+}')(factory('alnum'))
+        paths = ['/1', '/a', '/A', '/_a', '/a1']
+        A = make_app(Resource())
+        bodies = [A.get(path).body for path in paths]
+        before = [matcher for matcher, func in Resource.child_factories]
+        # The matchers only some path leads to, the latest one gets the hits.
+        only = {'{a:[A-Z]+}': '/A', '_{a}': '/_a', '{a:[a-z0-9]+}': '/a1'}
+        hot = [matcher for matcher in before if matcher.pattern in only][-1]
+        for i in range(20):
+            A.get(only[hot.pattern])
+        after = [matcher for matcher, func in Resource.child_factories]
+        assert after.index(hot) <= before.index(hot)
+        position = after.index(hot)
+        assert not position or not lint.disjoint(after[position - 1], hot)
+        # Only the disjoint matchers were swapped.
+        for i, matcher in enumerate(before):
+            for other in before[i + 1:]:
+                if not lint.disjoint(matcher, other):
+                    assert after.index(matcher) < after.index(other)
+        assert [A.get(path).body for path in paths] == bodies
+        stats = resource.child_stats(Resource)
+        assert stats[0][0] is hot and stats[0][1] >= 22
+        assert sum(hits for matcher, hits in stats) == 30
+
+    def test_adaptive_order_disabled(self):
+        class Resource(resource.Resource):
+            @resource.child('{a:[0-9]+}')
+            def number(self, request, segments, a):
+                return http.ok([('Content-Type', 'text/plain')], a)
+        make_app(Resource()).get('/1')
+        assert resource.child_stats(Resource)[0][1] == 0
+        assert '_child_hits' not in Resource.__dict__
+
     def _test_custom_match(self):
         self.fail()
 
+    def test_segment_cursor(self):
+        seen = []
+        class Leaf(resource.Resource):
+            def __init__(self, **kwargs):
+                self.kwargs = kwargs
+            def __call__(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               repr(sorted(self.kwargs.items())))
+        class Imperative(resource.Resource):
+            def resource_child(self, request, segments):
+                seen.append(segments)
+                return Leaf(), []
+        class Node(resource.Resource):
+            leaf = resource.child(u'\xa3{id}/{name}', Leaf)
+            imperative = resource.child('imperative', Imperative)
+            @resource.child('list/{id}')
+            def list(self, request, segments, id):
+                seen.append(segments)
+                return Leaf(id=id), []
+        class Root(resource.Resource):
+            node = resource.child('node/{node}', Node)
+        testapp = make_app(Root())
+        R = testapp.get(url.join_path([u'node', u'1', u'\xa31', u'x']))
+        self.assertEquals(R.body, "[('id', u'1'), ('name', u'x')]")
+        testapp.get('/node/1/list/2/a/b')
+        testapp.get('/node/1/imperative/a/b')
+        self.assertEquals(seen, [[u'a', u'b'], [u'a', u'b']])
+        assert [type(segments) for segments in seen] == [list, list]
+        # str keys out of unicode templates.
+        request = http.Request.blank('/')
+        for segments in [[u'\xa31', u'x'], url.SegmentCursor([u'\xa31', u'x'])]:
+            func, args, kwargs, remaining = Node._find_child(request, segments)
+            assert [type(key) for key in kwargs] == [str, str]
+            assert remaining == []
+            assert type(remaining) is type(segments)
+
 
 class TestAcceptContentNegotiation(unittest.TestCase):
 
@@ -968,6 +1407,116 @@ class TestContentTypeContentNegotiation(unittest.TestCase):
         assert response.headers['Content-Type'] == 'application/json'
         assert response.body == 'json_in_json_out'
 
+    def test_negotiator_matches_mimeparse(self):
+        """
+        Check the negotiator picks the dispatchers mimeparse would pick.
+        """
+        def filter(dispatchers, name, header):
+            supported = []
+            for d in dispatchers:
+                supported.extend(d[1][name])
+            best_match = mimeparse.best_match(supported, header)
+            return [d for d in dispatchers if best_match in d[1][name]]
+        class Resource(resource.Resource):
+            @resource.POST(accept=['text/html', 'text/plain;level=1'],
+                           content_type='json')
+            def a(self, request):
+                pass
+            @resource.POST(accept='text/*', content_type='text/xml')
+            def b(self, request):
+                pass
+            @resource.POST(accept=['application/json', 'text/plain'])
+            def c(self, request):
+                pass
+        dispatchers = Resource.request_dispatchers['POST']
+        negotiator = Resource._negotiators['POST']
+        content_types = [None, 'application/json',
+                         'text/xml', 'image/png']
+        accepts = [None, '*/*', 'text/plain', 'text/plain;level=1',
+                   'text/*;q=0.5, application/json', 'text/html;q=0.9, */*',
+                   'image/png', 'text/plain, text/html,', 'text/plain;q=0',
+                   'text/html, , application/json']
+        for content_type in content_types:
+            for accept in accepts:
+                expected = dispatchers
+                if content_type:
+                    expected = filter(expected, 'content_type', content_type)
+                if accept:
+                    expected = filter(expected, 'accept', accept.strip(', '))
+                negotiation = negotiator.negotiate(content_type, accept)
+                if expected:
+                    assert negotiation.dispatcher is expected[0]
+                else:
+                    assert negotiation.dispatcher is None
+        # Blank media ranges are skipped, and nothing left matches nothing.
+        supported = [s[1] for s in negotiator.accepts]
+        for header in ['', ' , ', 'text/html, , application/json']:
+            assert resource._best_match(negotiator.accepts, header) == \
+                    mimeparse.best_match(supported, header)
+
+    def test_no_accept_several_types(self):
+        class Resource(resource.Resource):
+            @resource.GET(accept=['text/html', 'application/json'])
+            def get(self, request):
+                return http.ok([], 'body')
+        testapp = make_app(Resource())
+        response = testapp.get('/')
+        assert response.body == 'body'
+        response = testapp.get('/', headers={'Accept':
+                                             'text/html, , application/json'})
+        assert response.headers['Content-Type'] == 'application/json'
+
+    def test_negotiation_cache(self):
+        """
+        Check the outcome of the negotiation is kept for the same headers.
+        """
+        class Resource(resource.Resource):
+            @resource.GET(accept='html')
+            def html(self, request):
+                return http.ok([], 'html')
+            @resource.GET(accept='json')
+            def json(self, request):
+                return http.ok([], 'json')
+        request = http.Request.blank('/', headers={'Accept': 'application/json'})
+        negotiator = Resource._negotiators['GET']
+        negotiation = resource._negotiate(negotiator, request)
+        assert resource._negotiate(negotiator, request) is negotiation
+        response = make_app(Resource()).get('/', headers={'Accept': 'application/json'})
+        assert response.body == 'json'
+        assert response.headers['Content-Type'] == 'application/json'
+
+    def test_negotiation_cache_content_type(self):
+        """
+        Check the parameters of the Content-Type that the negotiation does not
+        look at are left out of the cache key.
+        """
+        class Resource(resource.Resource):
+            @resource.POST(content_type='multipart/form-data')
+            def form(self, request):
+                pass
+            @resource.POST(content_type='text/plain;level=1')
+            def level(self, request):
+                pass
+            @resource.POST(content_type='text/*')
+            def text(self, request):
+                pass
+        negotiator = Resource._negotiators['POST']
+        def negotiate(content_type):
+            request = http.Request.blank('/')
+            request.environ.update({'REQUEST_METHOD': 'POST',
+                                    'CONTENT_TYPE': content_type})
+            return resource._negotiate(negotiator, request)
+        form = negotiate('multipart/form-data; boundary=a')
+        assert form.dispatcher[0].__name__ == 'form'
+        assert negotiate('multipart/form-data; boundary=b') is form
+        assert negotiate('multipart/form-data;boundary=c; charset=utf-8') \
+                is form
+        # The parameters of the supported content types are kept.
+        level = negotiate('text/plain; level=1; charset=utf-8')
+        assert level.dispatcher[0].__name__ == 'level'
+        assert negotiate('text/plain; charset=latin-1; level=1') is level
+        assert negotiate('text/plain; level=2; charset=utf-8') is not level
+
 
 class TestAcceptLists(unittest.TestCase):
 
@@ -1032,6 +1581,21 @@ class TestShortAccepts(unittest.TestCase):
         assert response.status == "200 OK"
         assert response.headers['Content-Type'] == 'application/json'
 
+    def test_builtin(self):
+        """
+        Check that the common short types do not depend on the system database.
+        """
+        assert resource._normalise_mimetype('xml') == 'application/xml'
+        # Others are left to the mimetypes module.
+        assert resource._normalise_mimetype('js') == \
+                mimetypes.guess_type('filename.js')[0]
+        mimetypes.add_type('application/x-restish', '.restish')
+        try:
+            assert resource._normalise_mimetype('restish') == \
+                    'application/x-restish'
+        finally:
+            del resource._MIMETYPES['restish']
+
     def test_unknown(self):
         """
         Check that unknown short types are not expanded and are still used.
@@ -1094,6 +1658,64 @@ class TestRedirectTo(unittest.TestCase):
         R = app.get("/spam/or/eggs", status=302)
 
 
+class TestSharedInstances(unittest.TestCase):
+
+    def _classes(self):
+        class Entry(resource.Resource):
+            shared_instances = 2
+            created = []
+            def __init__(self, id):
+                self.id = id
+                self.created.append(id)
+            @resource.GET()
+            def get(self, request):
+                return http.ok([('Content-Type', 'text/plain')],
+                               str(self.id))
+        class Parented(Entry):
+            def __init__(self, id, _parent):
+                Entry.__init__(self, id)
+        class Root(resource.Resource):
+            entry = resource.child('entry/{id}', Entry)
+            parented = resource.child('parented/{id}', Parented,
+                                      with_parent=True)
+        return Root, Entry
+
+    def test_shared(self):
+        Root, Entry = self._classes()
+        request = http.Request.blank('/')
+        root = Root()
+        first = root.resource_child(request, [u'entry', u'1'])[0]
+        assert root.resource_child(request, [u'entry', u'1'])[0] is first
+        assert root.resource_child(request, [u'entry', u'2'])[0] is not first
+        assert Entry.created == [u'1', u'2']
+        assert Entry._shared_cache.stats()['size'] == 2
+
+    def test_bounded(self):
+        Root, Entry = self._classes()
+        testapp = make_app(Root())
+        for id in ['1', '2', '3', '1']:
+            assert testapp.get('/entry/%s' % id).body == id
+        assert Entry.created == [u'1', u'2', u'3', u'1']
+
+    def test_not_with_parent(self):
+        Root, Entry = self._classes()
+        testapp = make_app(Root())
+        testapp.get('/parented/1')
+        testapp.get('/parented/1')
+        assert Entry.created == [u'1', u'1']
+
+    def test_not_shared(self):
+        class Entry(resource.Resource):
+            def __init__(self, id):
+                self.id = id
+        class Root(resource.Resource):
+            entry = resource.child('entry/{id}', Entry)
+        request = http.Request.blank('/')
+        root = Root()
+        assert root.resource_child(request, [u'entry', u'1'])[0] is not \
+                root.resource_child(request, [u'entry', u'1'])[0]
+
+
 class TestDeclarative(object):
 
     def test_sample(self):
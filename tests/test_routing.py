@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+import webtest
+
+from restish import app, http, resource, routing
+
+
+class Leaf(resource.Resource):
+    def __init__(self, **kwargs):
+        if '_parent' in kwargs:
+            kwargs['_parent'] = kwargs['_parent'].kwargs
+        self.kwargs = kwargs
+    def __call__(self, request):
+        return http.ok([('Content-Type', 'text/plain')],
+                       '%s %s' % (self.__class__.__name__,
+                                  sorted(self.kwargs.items())))
+
+
+class Entry(Leaf):
+    pass
+
+
+class Comment(Leaf):
+    pass
+
+
+class Dynamic(resource.Resource):
+    def __init__(self, **kwargs):
+        pass
+    def resource_child(self, request, segments):
+        return Leaf(segments=segments), []
+
+
+class Blog(Leaf):
+    entry = resource.child('{id:[0-9]+}', Entry)
+    latest = resource.child('latest', Entry)
+    comments = resource.child('{id:[0-9]+}/comments/{comment}', Comment)
+    dynamic = resource.child('dynamic', Dynamic)
+    parent = resource.child('parent', Leaf, with_parent=True)
+    @resource.child()
+    def imperative(self, request, segments):
+        return Leaf(imperative=True), segments
+
+
+class Root(Leaf):
+    blog = resource.child('blogs/{blog}', Blog)
+    about = resource.child('about/us', Leaf)
+
+
+class TestRouteTable(unittest.TestCase):
+
+    def test_routes(self):
+        table = routing.compile_routes(Root)
+        templates = sorted(route.template for route in table.routes)
+        assert templates == ['about/us',
+                             'blogs/{blog}',
+                             'blogs/{blog}/dynamic',
+                             'blogs/{blog}/latest',
+                             'blogs/{blog}/{id:[0-9]+}',
+                             'blogs/{blog}/{id:[0-9]+}/comments/{comment}']
+        routes = dict((route.template, route) for route in table.routes)
+        assert routes['blogs/{blog}/dynamic'].dynamic
+        assert routes['blogs/{blog}/latest'].classes == (Root, Blog, Entry)
+        assert table.static.keys() == [('about', 'us')]
+
+    def test_resolve(self):
+        table = routing.compile_routes(Root)
+        assert table.resolve(None, [u'about', u'us']) == \
+                ((Root, Leaf), [], {}, ())
+        assert table.resolve(None, [u'blogs', u'foo', u'1']) == \
+                ((Root, Blog, Entry), [], {'id': u'1'}, [])
+        # Imperative children need an instance of the resource.
+        assert table.resolve(None, [u'blogs', u'foo', u'imperative']) == \
+                ((Root, Blog), [], {'blog': u'foo'}, [u'imperative'])
+        assert table.resolve(None, [u'blogs', u'foo', u'parent']) == \
+                ((Root, Blog), [], {'blog': u'foo'}, [u'parent'])
+        # Overridden resource_child.
+        assert table.resolve(None, [u'blogs', u'foo', u'dynamic', u'x']) == \
+                ((Root, Blog, Dynamic), [], {}, [u'x'])
+        assert table.resolve(None, [u'nope']) is None
+
+    def test_same_responses(self):
+        plain = webtest.TestApp(app.RestishApp(Root()))
+        compiled = app.RestishApp(Root(), compile_routes=True)
+        assert compiled.routes is not None
+        compiled = webtest.TestApp(compiled)
+        for path in ['/', '/about/us', '/about', '/blogs/foo', '/blogs/foo/1',
+                     '/blogs/foo/latest', '/blogs/foo/1/comments/2',
+                     '/blogs/foo/imperative', '/blogs/foo/parent',
+                     '/blogs/foo/dynamic/a/b', '/blogs/foo/x', '/nope']:
+            expected = plain.get(path, status='*')
+            response = compiled.get(path, status='*')
+            assert response.status == expected.status, path
+            assert response.body == expected.body, path
+
+    def test_not_a_resource(self):
+        def root(request):
+            return http.ok([], 'root')
+        assert app.RestishApp(root, compile_routes=True).routes is None
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -4,6 +4,7 @@
 # See LICENSE for details.
 
 import unittest
+import urllib
 
 from restish import http, url
 
@@ -79,6 +80,30 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.join_path(['/']), '/%2F')
         self.assertEquals(url.join_path([POUND]), '/%C2%A3')
 
+    def test_split_path_fast_paths(self):
+        def split_path(path):
+            segments = [urllib.unquote(segment) for segment in path.split('/')]
+            if segments[:1] == ['']:
+                segments = segments[1:]
+            return [S.decode('utf-8') for S in segments]
+        for path in ['', '/', '/foo/bar/', 'foo', '/%C2%A3/a%2Fb/%25',
+                     '/\xc2\xa3/%C2%A3', '/a/%20/a', u'/foo/%20']:
+            self.assertEquals(url.split_path(path), split_path(path))
+            # Once more from the memo.
+            self.assertEquals(url.split_path(path), split_path(path))
+        assert isinstance(url.split_path('/foo')[0], unicode)
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/\xc2')
+        self.assertRaises(UnicodeDecodeError, url.split_path, '/%C2')
+
+    def test_segment_memos(self):
+        for n in xrange(url._MAX_SEGMENTS + 10):
+            url.split_path('/%%20%d' % n)
+            url.join_path([' %d' % n])
+        assert len(url._unquoted_segments) <= url._MAX_SEGMENTS
+        assert len(url._quoted_segments) <= url._MAX_SEGMENTS
+        self.assertEquals(url.join_path([' 1', POUND, POUND.encode('utf-8')]),
+                          '/%201/%C2%A3/%C2%A3')
+
     def test_split_query(self):
         self.assertEquals(url.split_query(''), [])
         self.assertEquals(url.split_query('a=1&b=2'), [('a', '1'), ('b', '2')])
@@ -100,6 +125,41 @@ class TestUtils(unittest.TestCase):
         self.assertEquals(url.join_query([(POUND, POUND)]), '%C2%A3=%C2%A3')
 
 
+class TestSegmentCursor(unittest.TestCase):
+
+    def test_list_behaviour(self):
+        segments = [u'a', u'b', u'c', u'd']
+        cursor = url.SegmentCursor(segments)
+        self.assertEquals(len(cursor), 4)
+        self.assertEquals(cursor, segments)
+        self.assertEquals(cursor[0], u'a')
+        self.assertEquals(cursor[-1], u'd')
+        self.assertRaises(IndexError, lambda: cursor[4])
+        self.assertEquals(list(cursor), segments)
+        self.assertEquals(repr(cursor), repr(segments))
+        assert u'c' in cursor and u'e' not in cursor
+        assert cursor != [u'a']
+        assert not url.SegmentCursor([])
+        self.assertEquals(cursor + [u'e'], segments + [u'e'])
+        self.assertEquals([u'z'] + cursor, [u'z'] + segments)
+        self.assertEquals(cursor.index(u'b'), 1)
+        self.assertEquals(cursor.count(u'b'), 1)
+        self.assertRaises(TypeError, hash, cursor)
+
+    def test_slices(self):
+        segments = [u'a', u'b', u'c', u'd']
+        cursor = url.SegmentCursor(segments)
+        for s in [slice(1, None), slice(None, 2), slice(1, 3), slice(-2, None),
+                  slice(3, 1), slice(5, None), slice(None, None, 2)]:
+            self.assertEquals(cursor[s], segments[s])
+            self.assertEquals(cursor[1:][s], segments[1:][s])
+        rest = cursor[2:]
+        assert isinstance(rest, url.SegmentCursor)
+        assert rest.segments is segments
+        self.assertEquals(rest[1:], [u'd'])
+        self.assertEquals(rest[:1], [u'c'])
+
+
 class TestURL(unittest.TestCase):
     
     def test_properties(self):
@@ -466,6 +526,22 @@ class TestURL(unittest.TestCase):
         relative = url.URL(u'/~yoan?currency=€')
         assert relative == '/~yoan?currency=%E2%82%AC'
 
+    def test_lazy_parsing(self):
+        u = url.URL('http://localhost/a').child('b')
+        assert '_parsed_url' not in u.__dict__
+        assert u == 'http://localhost/a/b'
+        assert '_parsed_url' not in u.__dict__
+        self.assertEquals(u.path, '/a/b')
+        assert u.parsed_url is u.parsed_url
+
+    def test_equality(self):
+        u = url.URL('HTTP://localhost/?')
+        assert u == 'HTTP://localhost/?'
+        assert u == 'http://localhost/'
+        assert u == url.URL('http://localhost/')
+        assert not u == 'http://localhost/a'
+        assert not u == u'http://localhost/'
+
 
 class Serialization(unittest.TestCase):
 
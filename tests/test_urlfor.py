@@ -193,6 +193,23 @@ class TestUrlFor(unittest.TestCase):
             assert resource.url_for(klass, **args) == url, url
             assert resource.url_for(klass, args) == url, url
     
+    def test_typed(self):
+        class File(resource.Resource):
+            pass
+
+        class Item(resource.Resource):
+            pass
+
+        class Resource(resource.Resource):
+            item = resource.child('items/{id:int}', Item)
+            file = resource.child('files/{path:path}', File)
+
+        self.assertEquals(resource.url_for(Item, id=42), '/items/42')
+        self.assertEquals(resource.url_for(File, path='a/b c/d.txt'),
+                          '/files/a/b%20c/d.txt')
+        self.assertEquals(list(resource.urls_for(File, [{'path': 'a/b'}])),
+                          ['/files/a/b'])
+
     def test_canonical(self):
         class Book(resource.Resource):
             def __init__(self, title, **kwargs):
@@ -284,6 +301,84 @@ class TestUrlFor(unittest.TestCase):
             # reverse url
             assert resource.url_for("abc", obj) == path
 
+    def test_compiled_formatter(self):
+        def url_for(cls, *args, **kwargs):
+            parents = []
+            while hasattr(cls, '_parent'):
+                segments = cls._parent.child_matchers.get(cls, None)._url_for(*args, **kwargs)
+                segments.reverse()
+                parents += segments
+                cls = cls._parent
+            if len(parents):
+                parents.reverse()
+            else:
+                parents = ['']
+            return url.URL('/').child(*parents)
+
+        class Obj(object):
+            id = u"ä b"
+            slug = "x/y"
+
+        class Leaf(resource.Resource):
+            pass
+
+        class Odd(resource.Resource):
+            pass
+
+        class Middle(resource.Resource):
+            leaf = resource.child(u"£{slug:[a-z]+}.html", Leaf)
+            odd = resource.child("100%%/{slug}", Odd)
+
+        class Root(resource.Resource):
+            middle = resource.child("items/{id}", Middle)
+
+        for cls in Root, Middle, Leaf, Odd:
+            for args, kwargs in [((), {'id': 1, 'slug': 'a b'}),
+                                 (({'id': u'é', 'slug': 'c'},), {}),
+                                 ((Obj(),), {})]:
+                def outcome(func):
+                    try:
+                        return func(cls, *args, **kwargs)
+                    except Exception, e:
+                        return type(e)
+                assert outcome(resource.url_for) == outcome(url_for)
+        assert resource.url_for(Leaf, id=1, slug='a') == "/items/1/%C2%A3a.html"
+        self.assertRaises(KeyError, resource.url_for, Leaf, id=1)
+        self.assertRaises(KeyError, resource.url_for, Leaf, object())
+
+        # Moving Leaf elsewhere changes its URL.
+        class Other(resource.Resource):
+            leaf = resource.child("leaf", Leaf)
+        assert resource.url_for(Leaf) == "/leaf"
+
+    def test_urls_for(self):
+        class Obj(object):
+            def __init__(self, id):
+                self.id = id
+
+        class Entry(resource.Resource):
+            pass
+
+        class Odd(resource.Resource):
+            pass
+
+        class Root(resource.Resource):
+            entry = resource.child("entries/{id}", Entry)
+            odd = resource.child("100%%/{id}", Odd)
+
+        objects = [Obj(1), {'id': u'£'}, Obj('a b'), Obj('a b')]
+        urls = [resource.url_for(Entry, obj) for obj in objects]
+        assert resource.urls_for(Entry, objects) == urls
+        assert resource.urls_for("entry", objects) == urls
+        generated = resource.urls_for(Entry, iter(objects), lazy=True)
+        assert not isinstance(generated, list)
+        assert list(generated) == urls
+        assert resource.urls_for(Odd, [{'id': 1}]) == ["/100%25/1"]
+        assert resource.urls_for(Root, objects[:2]) == ["/", "/"]
+        assert resource.urls_for(Entry, []) == []
+        self.assertRaises(KeyError, resource.urls_for, Entry, [object()])
+        self.assertRaises(KeyError, resource.urls_for, Entry, [{}])
+
 
 if __name__ == "__main__":
     unittest.main()